@@ -12,6 +12,26 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+
+# Лимиты рассылки напоминаний (Telegram: ~30 сообщений/с на бота, ~1 сообщение/с в чат)
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", 16))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+# Пул соединений клиента Bot API в процессе воркера и время жизни простаивающего соединения, с
+TELEGRAM_CONNECTION_POOL_SIZE = int(os.getenv("TELEGRAM_CONNECTION_POOL_SIZE", TELEGRAM_SEND_CONCURRENCY))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", 120))
+# Размер порции при потоковом чтении получателей напоминаний
+REMINDER_CHUNK_SIZE = int(os.getenv("REMINDER_CHUNK_SIZE", 2000))
+# Число шардов рассылки, которые параллельно обрабатывают воркеры Celery
+REMINDER_SHARDS = int(os.getenv("REMINDER_SHARDS", 8))
+# Повторы неудачных напоминаний из outbox: число попыток, базовая пауза и аренда строки, в секундах
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", 5))
+REMINDER_RETRY_BACKOFF = int(os.getenv("REMINDER_RETRY_BACKOFF", 60))
+REMINDER_CLAIM_LEASE = int(os.getenv("REMINDER_CLAIM_LEASE", 300))
+# Режим дайджеста: одновременные напоминания одного чата отправляются одним сообщением
+REMINDER_DIGEST = True if os.getenv("REMINDER_DIGEST") == "True" else False
 
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY")
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
@@ -119,20 +139,62 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        "users.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "habits.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
 }
 
+# Максимум привычек в одном запросе массового создания, изменения или удаления
+HABIT_BULK_MAX_ITEMS = int(os.getenv("HABIT_BULK_MAX_ITEMS", 500))
+# Наибольшая глубина обхода графа связанных привычек
+HABIT_GRAPH_MAX_DEPTH = int(os.getenv("HABIT_GRAPH_MAX_DEPTH", 10))
+# Размер порции чтения при потоковой выгрузке привычек
+HABIT_EXPORT_CHUNK_SIZE = int(os.getenv("HABIT_EXPORT_CHUNK_SIZE", 2000))
+# Размер порции импорта: столько строк проверяется и записывается в одной транзакции
+HABIT_IMPORT_BATCH_SIZE = int(os.getenv("HABIT_IMPORT_BATCH_SIZE", 5000))
+
+# Общий кеш веб-процессов и воркеров Celery: по умолчанию отдельная база того же Redis, что нужен Celery.
+# Версии ETag и публичной ленты сбрасываются в любом процессе и должны быть видны всем остальным, поэтому
+# память процесса (CACHE_URL=locmem://) годится только для одного процесса, например для тестов
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/1")
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        if CACHE_URL == "locmem://"
+        else {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}
+    )
+}
+# Время жизни версий ETag и ленты в кеше, с: ограничивает устаревание, если сброс версии не дошёл до кеша
+CACHE_VERSION_TIMEOUT = int(os.getenv("CACHE_VERSION_TIMEOUT", 600))
+# Время жизни страниц публичной ленты в кеше, с; изменения привычек сбрасывают кеш сразу
+PUBLIC_FEED_CACHE_TIMEOUT = int(os.getenv("PUBLIC_FEED_CACHE_TIMEOUT", 300))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
+# Проверенных JWT в памяти процесса и время жизни пользователя в кеше аутентификации, с
+JWT_VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("JWT_VERIFIED_TOKEN_CACHE_SIZE", 10000))
+JWT_USER_CACHE_TIMEOUT = int(os.getenv("JWT_USER_CACHE_TIMEOUT", 60))
+# Отзыв JWT: Bloom-фильтр процесса пересобирается из базы раз в JWT_REVOCATION_SYNC_INTERVAL секунд
+JWT_REVOCATION_SYNC_INTERVAL = int(os.getenv("JWT_REVOCATION_SYNC_INTERVAL", 30))
+JWT_REVOCATION_BLOOM_CAPACITY = int(os.getenv("JWT_REVOCATION_BLOOM_CAPACITY", 100000))
+JWT_REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("JWT_REVOCATION_BLOOM_ERROR_RATE", 0.001))
+# Асинхронные вход и регистрация (включаются в config/asgi.py); пароли хешируются в своём пуле потоков
+ASYNC_AUTH_VIEWS = True if os.getenv("ASYNC_AUTH_VIEWS") == "True" else False
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Сколько запросов может ждать свободный поток хеширования, остальные получают 503
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 64))
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "https://your-frontend-domain.com",
@@ -157,9 +219,23 @@ CELERY_BEAT_SCHEDULE = {
         "task": "habits.tasks.send_habit_reminders",
         "schedule": crontab(minute="*/1"),
     },
+    "retry-reminder-deliveries": {
+        "task": "habits.tasks.retry_reminder_deliveries",
+        "schedule": crontab(minute="*/1"),
+    },
+    "refresh-dst-schedules": {
+        "task": "habits.tasks.refresh_dst_schedules",
+        "schedule": crontab(minute=0, hour=0),
+    },
+    "purge-token-revocations": {
+        "task": "users.tasks.purge_token_revocations",
+        "schedule": crontab(minute=30, hour=0),
+    },
 }
 
 CELERY_BROKER_URL = "redis://localhost:6379/0"
+# Хранилище результатов нужно chord-у, собирающему счётчики шардов рассылки
+CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 
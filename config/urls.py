@@ -5,6 +5,7 @@ from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 from rest_framework.routers import DefaultRouter
 
+from habits import async_views
 from habits.views import HabitViewSet
 
 schema_view = get_schema_view(
@@ -36,4 +37,8 @@ urlpatterns = [
     path("api/", include(router.urls)),  # Корень API должен быть /api/
     path("api-auth/", include("rest_framework.urls")),
     path('api/users/', include('users.urls')),
+    # Асинхронные варианты чтения привычек для ASGI: поток не занят, пока идёт ожидание базы
+    path("api/async/habits/", async_views.habit_list, name="async-habit-list"),
+    path("api/async/habits/public/", async_views.public_feed, name="async-habit-public"),
+    path("api/async/habits/<int:pk>/", async_views.habit_detail, name="async-habit-detail"),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Habit
+from .models import Habit, ReminderDelivery
 
 
 @admin.register(Habit)
@@ -16,3 +16,11 @@ class HabitAdmin(admin.ModelAdmin):
         "place",  # Поиск по месту
         "reward",  # Поиск по вознаграждению
     )
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("idempotency_key", "chat_id", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("idempotency_key", "chat_id")
+    raw_id_fields = ("habit",)
@@ -0,0 +1,119 @@
+import logging
+
+from django.http import HttpResponse
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+
+from users.authentication import aauthenticate
+from .cache import aget_public_feed_page, auser_habits_etag
+from .models import Habit
+from .paginators import HabitCursorPagination
+from .renderers import ORJSONRenderer
+from .views import public_feed_params, public_feed_response, requested_fields, values_serializer
+
+# Инициализируем логгер
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(ORJSONRenderer().render(data), content_type="application/json", status=status_code)
+
+
+def error_response(exc):
+    """Ответ на исключение DRF в том же виде, что у синхронных представлений."""
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = json_response(detail, exc.status_code)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+
+def api_view(view):
+    """Асинхронное представление только для GET: исключения DRF превращаются в ответы с ошибкой."""
+
+    @require_GET
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            logger.error(f"Ошибка в асинхронном представлении привычек: {exc}")
+            return error_response(exc)
+
+    return wrapper
+
+
+async def authenticated_user(request):
+    user = await aauthenticate(request)
+    if user is None:
+        raise NotAuthenticated
+    return user
+
+
+async def conditional_response(request, user, respond):
+    """Как HabitViewSet.conditional_response: 304 без запроса к привычкам, если ETag совпал."""
+    etag = quote_etag(await auser_habits_etag(user.pk, request.get_full_path(), "json"))
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = await respond()
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response["ETag"] = etag
+    return response
+
+
+async def values_page(request, queryset):
+    """Страница строк values() по курсору: пагинатор со ссылками на соседние страницы и вывод строк."""
+    serializer = values_serializer(requested_fields(request.GET))
+    paginator = HabitCursorPagination()
+    queryset = serializer.values(queryset, *paginator.cursor_fields)
+    page = await paginator.apaginate_queryset(queryset, Request(request))
+    return paginator, serializer.to_representation(page)
+
+
+async def paginated_values(request, queryset):
+    """Асинхронный HabitViewSet.paginated_values: тот же курсор и тот же JSON."""
+    paginator, results = await values_page(request, queryset)
+    return paginator.get_paginated_response(results).data
+
+
+@api_view
+async def habit_list(request):
+    """Привычки пользователя по курсору; без потока на время ожидания базы и медленного клиента."""
+    user = await authenticated_user(request)
+
+    async def respond():
+        return json_response(await paginated_values(request, Habit.objects.filter(user=user)))
+
+    return await conditional_response(request, user, respond)
+
+
+@api_view
+async def habit_detail(request, pk):
+    user = await authenticated_user(request)
+
+    async def respond():
+        serializer = values_serializer(requested_fields(request.GET))
+        try:
+            row = await serializer.values(Habit.objects.filter(user=user)).aget(pk=pk)
+        except Habit.DoesNotExist:
+            # Тот же текст, что у get_object_or_404 в HabitViewSet.retrieve
+            raise NotFound(f"No {Habit._meta.object_name} matches the given query.")
+        return json_response(serializer.to_representation([row])[0])
+
+    return await conditional_response(request, user, respond)
+
+
+@api_view
+async def public_feed(request):
+    """Публичная лента из того же кеша, что и /api/habits/public/; доступна без авторизации."""
+
+    async def build():
+        paginator, results = await values_page(request, Habit.objects.filter(is_public=True))
+        return {"results": results, **paginator.get_page_cursors()}
+
+    page = await aget_public_feed_page(public_feed_params(Request(request)), build)
+    return json_response(public_feed_response(request, page))
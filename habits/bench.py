@@ -0,0 +1,69 @@
+"""Общие части команд-бенчмарков: отчёт, перцентили, засев и уборка пользователей."""
+
+import json
+import statistics
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from habits.models import Habit, Profile, ReminderDelivery
+from habits.utils import chunked
+
+User = get_user_model()
+
+SEED_BATCH_SIZE = 10000
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(share * 100) - 1]
+
+
+def new_report(params):
+    return {
+        "started_at": timezone.now().isoformat(),
+        "database": connection.vendor,
+        "params": params,
+        "results": [],
+    }
+
+
+def write_report(command, report, output):
+    Path(output).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    command.stdout.write(command.style.SUCCESS(f"Результаты записаны в {output}"))
+
+
+def bench_users(domain):
+    return User.objects.filter(email__endswith=f"@{domain}")
+
+
+def seed_users(domain, count, prefix="user", password="!"):
+    """Создаёт пользователей {prefix}{i}@{domain} пачками по SEED_BATCH_SIZE; возвращает их id по порядку."""
+    for batch in chunked(range(count), SEED_BATCH_SIZE):
+        User.objects.bulk_create(
+            [
+                User(email=f"{prefix}{i}@{domain}", password=password, first_name="Bench", last_name=str(i))
+                for i in batch
+            ]
+        )
+    return list(bench_users(domain).order_by("pk").values_list("pk", flat=True))
+
+
+def delete_bench_users(domain):
+    """Удаляет пользователей бенчмарка и их данные напрямую в SQL: каскад ORM на миллионах строк слишком медленный."""
+    users = bench_users(domain).values("pk")
+    habits = Habit.objects.filter(user__in=users).values("pk")
+    with connection.cursor() as cursor:
+        for queryset in (
+            ReminderDelivery.objects.filter(habit__in=habits),
+            Habit.objects.filter(user__in=users),
+            Profile.objects.filter(user__in=users),
+            bench_users(domain),
+        ):
+            sql, params = queryset.values("pk").query.sql_with_params()
+            cursor.execute(f"DELETE FROM {queryset.model._meta.db_table} WHERE id IN ({sql})", params)
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_public_feed, invalidate_user_habits
+from .models import Habit, get_user_timezone
+from .serializers import BulkHabitSerializer
+
+
+class BulkError(Exception):
+    """Ошибки пакета: по словарю на каждый элемент в порядке запроса, пустой — если элемент верен."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def check_batch(items):
+    if not isinstance(items, list):
+        raise BulkError({"non_field_errors": ["Ожидается массив элементов."]})
+    if len(items) > settings.HABIT_BULK_MAX_ITEMS:
+        raise BulkError({"non_field_errors": [f"Не больше {settings.HABIT_BULK_MAX_ITEMS} элементов за запрос."]})
+
+
+def prefetch_related_habits(items):
+    """Все связанные привычки пакета одним запросом."""
+    pks = {parse_pk(item.get("related_habit")) for item in items if isinstance(item, dict)}
+    pks.discard(None)
+    return Habit.objects.in_bulk(pks) if pks else {}
+
+
+def invalidate_after_commit(user, habits):
+    user_id = user.pk
+    transaction.on_commit(lambda: invalidate_user_habits([user_id]))
+    if any(habit.is_public or getattr(habit, "_loaded_is_public", False) for habit in habits):
+        transaction.on_commit(invalidate_public_feed)
+
+
+def bulk_create_habits(user, items):
+    """Проверяет все элементы и создаёт привычки одним bulk_create; при любой ошибке не создаёт ничего."""
+    check_batch(items)
+    context = {"related_habits": prefetch_related_habits(items)}
+    serializers = [BulkHabitSerializer(data=item, context=context) for item in items]
+    errors = [{} if serializer.is_valid() else serializer.errors for serializer in serializers]
+    if any(errors):
+        raise BulkError(errors)
+
+    tz = get_user_timezone(user.pk)
+    habits = [Habit(user=user, **serializer.validated_data) for serializer in serializers]
+    for habit in habits:
+        habit.sync_schedule(tz)
+    with transaction.atomic():
+        # bulk_create не вызывает save() и сигналы, поэтому сроки и кеши обновляются здесь
+        habits = Habit.objects.bulk_create(habits)
+        invalidate_after_commit(user, habits)
+    return habits
+
+
+def bulk_update_habits(user, items):
+    """Частично обновляет привычки пользователя по id одним bulk_update; при любой ошибке не меняет ничего."""
+    check_batch(items)
+    pks = [parse_pk(item.get("id")) if isinstance(item, dict) else None for item in items]
+    habits = Habit.objects.filter(user=user).in_bulk([pk for pk in pks if pk is not None])
+    context = {"related_habits": prefetch_related_habits(items)}
+
+    errors, serializers, seen = [], [], set()
+    for item, pk in zip(items, pks):
+        if pk is None or pk in seen:
+            errors.append({"id": ["Нужен уникальный id привычки."]})
+            continue
+        if pk not in habits:
+            errors.append({"id": ["Привычка не найдена."]})
+            continue
+        seen.add(pk)
+        serializer = BulkHabitSerializer(habits[pk], data=item, partial=True, context=context)
+        errors.append({} if serializer.is_valid() else serializer.errors)
+        serializers.append(serializer)
+    if any(errors):
+        raise BulkError(errors)
+
+    tz = get_user_timezone(user.pk)
+    now = timezone.now()
+    fields = {"next_due_at", "updated_at"}
+    updated = []
+    for serializer in serializers:
+        habit = serializer.instance
+        for name, value in serializer.validated_data.items():
+            setattr(habit, name, value)
+            fields.add(name)
+        habit.sync_schedule(tz)
+        habit.updated_at = now
+        updated.append(habit)
+    with transaction.atomic():
+        Habit.objects.bulk_update(updated, sorted(fields))
+        invalidate_after_commit(user, updated)
+    return updated
+
+
+def bulk_delete_habits(user, ids):
+    """Удаляет привычки пользователя по списку id; если хоть одна не найдена, не удаляет ничего."""
+    check_batch(ids)
+    pks = [parse_pk(pk) for pk in ids]
+    found = set(
+        Habit.objects.filter(user=user, pk__in=[pk for pk in pks if pk is not None]).values_list("pk", flat=True)
+    )
+    errors = [{} if pk in found else {"id": ["Привычка не найдена."]} for pk in pks]
+    if any(errors):
+        raise BulkError(errors)
+    with transaction.atomic():
+        Habit.objects.filter(user=user, pk__in=found).delete()
+    return len(found)
@@ -0,0 +1,87 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PUBLIC_FEED_VERSION_KEY = "habits:public_feed:version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Версия от времени: после вытеснения, удаления или истечения ключа старые значения не оживут
+        cache.add(key, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+def get_public_feed_version():
+    return get_version(PUBLIC_FEED_VERSION_KEY)
+
+
+def invalidate_public_feed():
+    """Сбрасывает все страницы публичной ленты сменой версии в ключах кеша."""
+    try:
+        cache.incr(PUBLIC_FEED_VERSION_KEY)
+    except ValueError:
+        cache.add(PUBLIC_FEED_VERSION_KEY, time.time_ns(), settings.CACHE_VERSION_TIMEOUT)
+
+
+def public_feed_key(params, version=None):
+    """Ключ страницы ленты по параметрам, от которых она зависит: курсору, размеру страницы и полям.
+
+    Адрес запроса в ключ не входит: лишние параметры и другой Host не плодят копии страниц.
+    """
+    if version is None:
+        version = get_public_feed_version()
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f"habits:public_feed:{version}:{digest}"
+
+
+def get_public_feed_page(params, build):
+    """Страница ленты из кеша; при промахе строится вызовом build и кладётся в кеш."""
+    key = public_feed_key(params)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.PUBLIC_FEED_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_public_feed_page(params, build):
+    """Асинхронный get_public_feed_page: build — корутинная функция."""
+    key = public_feed_key(params, await aget_version(PUBLIC_FEED_VERSION_KEY))
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, settings.PUBLIC_FEED_CACHE_TIMEOUT)
+    return data
+
+
+def user_habits_version_key(user_id):
+    return f"habits:user:{user_id}:version"
+
+
+def invalidate_user_habits(user_ids):
+    """Меняет версии привычек пользователей: удалённый ключ получит новую версию при чтении."""
+    cache.delete_many([user_habits_version_key(user_id) for user_id in set(user_ids)])
+
+
+def user_habits_etag(user_id, *parts):
+    """Сильный ETag ответа по версии привычек пользователя и параметрам запроса."""
+    version = get_version(user_habits_version_key(user_id))
+    return hashlib.md5(":".join(map(str, (version, *parts))).encode()).hexdigest()
+
+
+async def auser_habits_etag(user_id, *parts):
+    version = await aget_version(user_habits_version_key(user_id))
+    return hashlib.md5(":".join(map(str, (version, *parts))).encode()).hexdigest()
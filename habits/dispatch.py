@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+import telegram
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReminderMessage:
+    """Одно сообщение для отправки: ключ для сопоставления результата, чат и текст."""
+
+    key: object
+    chat_id: str
+    text: str
+
+
+@dataclass(frozen=True)
+class DeliveryResult:
+    """Результат отправки сообщения."""
+
+    key: object
+    ok: bool
+    error: str = None
+
+
+class TokenBucket:
+    """Ограничитель частоты: не больше rate токенов в секунду с запасом capacity."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self):
+        """Забирает токен и возвращает, сколько секунд нужно подождать до отправки."""
+        now = self._clock()
+        self._refill(now)
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._blocked_until - now)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Блокирует выдачу токенов на время, указанное Telegram в retry_after."""
+        self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+
+def _retry_after_seconds(value):
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class ReminderDispatcher:
+    """Параллельная отправка напоминаний с учётом лимитов Telegram Bot API.
+
+    Telegram допускает около 30 сообщений в секунду на бота и около одного
+    сообщения в секунду в один чат, поэтому каждая отправка проходит через
+    общий ограничитель и ограничитель своего чата. Ответ 429 приостанавливает
+    общий ограничитель на retry_after секунд, после чего сообщение повторяется.
+    """
+
+    def __init__(self, bot, concurrency=16, global_rate=30, chat_rate=1, max_retries=3):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        return bucket
+
+    async def send(self, message):
+        """Отправляет одно сообщение, повторяя его после ответов 429."""
+        for _ in range(self.max_retries + 1):
+            await self._chat_bucket(message.chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=message.chat_id, text=message.text)
+                return DeliveryResult(message.key, True)
+            except telegram.error.RetryAfter as e:
+                retry_after = _retry_after_seconds(e.retry_after)
+                logger.warning(f"Превышен лимит Telegram, пауза {retry_after} с (чат {message.chat_id})")
+                self.global_bucket.pause(retry_after)
+                error = str(e)
+            except telegram.error.TelegramError as e:
+                return DeliveryResult(message.key, False, str(e))
+            except Exception as e:
+                # Сетевые и прочие ошибки не должны останавливать остальные отправки
+                return DeliveryResult(message.key, False, repr(e))
+        return DeliveryResult(message.key, False, error)
+
+    async def send_all(self, messages):
+        """Отправляет сообщения не более чем в concurrency параллельных потоках."""
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results = []
+
+        async def worker():
+            while True:
+                message = await queue.get()
+                try:
+                    results.append(await self.send(message))
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for message in messages:
+                await queue.put(message)
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return results
@@ -0,0 +1,42 @@
+import csv
+
+from .renderers import ORJSONRenderer
+from .serializers import habit_values_serializer
+from .utils import chunked
+
+
+class Echo:
+    """Псевдофайл для csv.writer: writerow возвращает готовую строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def export_chunks(queryset, chunk_size):
+    """Привычки для выгрузки порциями в формате API; в памяти не больше одной порции."""
+    # На PostgreSQL iterator() читает через серверный курсор, и первая порция уходит до конца запроса
+    rows = habit_values_serializer.values(queryset).iterator(chunk_size=chunk_size)
+    for chunk in chunked(rows, chunk_size):
+        yield habit_values_serializer.to_representation(chunk)
+
+
+def ndjson_stream(queryset, chunk_size):
+    """NDJSON: по одному JSON-объекту привычки в строке, как в ответах API."""
+    renderer = ORJSONRenderer()
+    for items in export_chunks(queryset, chunk_size):
+        yield b"".join(renderer.render(item) + b"\n" for item in items)
+
+
+def csv_stream(queryset, chunk_size):
+    """CSV с заголовком из имён полей API; пустые значения выводятся пустыми ячейками."""
+    writer = csv.writer(Echo())
+    field_names = habit_values_serializer.field_names
+    yield writer.writerow(field_names)
+    for items in export_chunks(queryset, chunk_size):
+        yield "".join(writer.writerow([item[name] for name in field_names]) for item in items)
+
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_stream, "application/x-ndjson", "habits.ndjson"),
+    "csv": (csv_stream, "text/csv; charset=utf-8", "habits.csv"),
+}
@@ -0,0 +1,248 @@
+import csv
+import io
+import json
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import parse_pk
+from .cache import invalidate_public_feed, invalidate_user_habits
+from .models import Habit, get_user_timezone
+from .utils import chunked
+from .validators import (
+    validate_execution_time,
+    validate_periodicity,
+    validate_pleasant_habit,
+    validate_related_habit_is_pleasant,
+    validate_reward_and_related_habit,
+)
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Поля, которые принимаются из файла; остальные (id, user, даты, сроки) назначаются при импорте
+IMPORT_FIELDS = (
+    "place",
+    "time",
+    "action",
+    "is_pleasant",
+    "periodicity",
+    "reward",
+    "execution_time",
+    "is_public",
+    "related_habit",
+)
+# Колонки COPY: всё, что bulk_create заполнил бы сам
+COPY_COLUMNS = (
+    "user_id",
+    "place",
+    "time",
+    "action",
+    "is_pleasant",
+    "related_habit_id",
+    "periodicity",
+    "reward",
+    "execution_time",
+    "is_public",
+    "next_due_at",
+    "created_at",
+    "updated_at",
+)
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта: число записанных и отклонённых строк и ошибки отклонённых по номеру строки."""
+
+    imported: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+
+def parse_ndjson(lines):
+    """Пары (номер строки, объект или None, ошибки) из NDJSON; пустые строки пропускаются."""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, {"non_field_errors": ["Некорректный JSON."]}
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, {"non_field_errors": ["Ожидается объект привычки."]}
+            continue
+        yield line_no, row, None
+
+
+def parse_csv(lines):
+    """Пары (номер строки, объект, ошибки) из CSV с заголовком."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv}
+
+
+def clean_row(row, related_habits):
+    """Приводит значения строки к типам полей и проверяет правила habits.validators.
+
+    Возвращает аргументы для Habit и словарь ошибок (пустой, если строка верна).
+    """
+    values, errors = {}, {}
+    for name in IMPORT_FIELDS:
+        model_field = Habit._meta.get_field(name)
+        value = row.get(name)
+        if value == "":
+            # Пустая строка в NDJSON значит то же, что пустая ячейка CSV
+            value = None
+        if name == "related_habit":
+            if value is None:
+                values[name] = None
+            elif (habit := related_habits.get(parse_pk(value))) is None:
+                errors[name] = [f"Привычка {value} не найдена."]
+            else:
+                values[name] = habit
+            continue
+        if value is None:
+            if model_field.has_default():
+                values[name] = model_field.get_default()
+            elif model_field.null:
+                values[name] = None
+            else:
+                errors[name] = ["Обязательное поле."]
+            continue
+        try:
+            if isinstance(value, (list, dict)):
+                # CharField превратил бы список в его repr; вложенные значения в строке не бывают
+                raise TypeError(value)
+            value = model_field.to_python(value)
+            model_field.run_validators(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+            continue
+        except (TypeError, ValueError):
+            # Значение не того типа (число вместо строки времени, список, объект): ошибка строки, а не импорта
+            errors[name] = ["Некорректное значение."]
+            continue
+        values[name] = value
+
+    for name, validate in (("execution_time", validate_execution_time), ("periodicity", validate_periodicity)):
+        if name in values:
+            try:
+                validate(values[name])
+            except ValidationError as e:
+                errors.setdefault(name, []).extend(e.messages)
+    if not errors:
+        try:
+            validate_pleasant_habit(values["reward"], values["related_habit"], values["is_pleasant"])
+            validate_reward_and_related_habit(values["reward"], values["related_habit"])
+            validate_related_habit_is_pleasant(values["related_habit"])
+        except ValidationError as e:
+            errors["non_field_errors"] = e.messages
+    return values, errors
+
+
+def copy_habits(habits):
+    """Записывает привычки через COPY FROM STDIN: на PostgreSQL быстрее многострочного INSERT."""
+    buffer = io.StringIO()
+    # Пустое значение без кавычек COPY читает как NULL; пустых строк clean_row не пропускает
+    writer = csv.writer(buffer)
+    for habit in habits:
+        writer.writerow(
+            [
+                habit.user_id,
+                habit.place,
+                habit.time.isoformat(),
+                habit.action,
+                habit.is_pleasant,
+                habit.related_habit_id,
+                habit.periodicity,
+                habit.reward,
+                habit.execution_time,
+                habit.is_public,
+                habit.next_due_at.isoformat(),
+                habit.created_at.isoformat(),
+                habit.updated_at.isoformat(),
+            ]
+        )
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Habit._meta.db_table} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+
+class HabitImporter:
+    """Потоковый импорт привычек пользователя из NDJSON или CSV.
+
+    Строки читаются и проверяются порциями по batch_size: связанные привычки
+    порции загружаются одним запросом, верные строки пишутся одним bulk_create
+    (или COPY на PostgreSQL) в своей транзакции. Неверные строки пропускаются
+    и попадают в ошибки с номером строки; после каждой порции вызывается
+    progress(result, line_no). В ответ попадают первые max_errors ошибок
+    (None — все).
+    """
+
+    def __init__(self, user, batch_size=None, use_copy=None, progress=None, max_errors=1000):
+        self.user = user
+        self.batch_size = batch_size or settings.HABIT_IMPORT_BATCH_SIZE
+        self.use_copy = connection.vendor == "postgresql" if use_copy is None else use_copy
+        self.progress = progress
+        self.max_errors = max_errors
+
+    def run(self, lines, fmt):
+        result = ImportResult()
+        tz = get_user_timezone(self.user.pk)
+        has_public = False
+        try:
+            for batch in chunked(PARSERS[fmt](lines), self.batch_size):
+                related_pks = {parse_pk(row.get("related_habit")) for _, row, _ in batch if row}
+                related_pks.discard(None)
+                related_habits = Habit.objects.filter(user=self.user).in_bulk(related_pks) if related_pks else {}
+
+                # В COPY вся порция получает одно created_at, но id выдаются по порядку строк файла,
+                # поэтому постраничный вывод по (created_at, id) сохраняет порядок импорта
+                now = timezone.now()
+                habits = []
+                for line_no, row, errors in batch:
+                    if row is not None:
+                        values, errors = clean_row(row, related_habits)
+                    if errors:
+                        result.failed += 1
+                        if self.max_errors is None or len(result.errors) < self.max_errors:
+                            result.errors.append({"line": line_no, "errors": errors})
+                        continue
+                    habit = Habit(user=self.user, created_at=now, updated_at=now, **values)
+                    habit.sync_schedule(tz)
+                    habits.append(habit)
+                    has_public = has_public or habit.is_public
+
+                self.write(habits)
+                result.imported += len(habits)
+                if self.progress:
+                    self.progress(result, batch[-1][0])
+        finally:
+            # Записанные порции уже видны в API, даже если импорт прервался на следующей
+            if result.imported:
+                invalidate_user_habits([self.user.pk])
+                if has_public:
+                    invalidate_public_feed()
+        logger.info(
+            f"Импорт привычек пользователя {self.user.email}: записано {result.imported}, отклонено {result.failed}"
+        )
+        return result
+
+    def write(self, habits):
+        if not habits:
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                copy_habits(habits)
+            else:
+                Habit.objects.bulk_create(habits)
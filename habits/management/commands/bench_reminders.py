@@ -0,0 +1,151 @@
+import time
+from datetime import time as dt_time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from habits.bench import SEED_BATCH_SIZE, delete_bench_users, new_report, percentile, seed_users, write_report
+from habits.models import Habit, Profile
+from habits.tasks import send_reminder_shard
+from habits.telegram_client import close_client
+from habits.telegram_stub import StubBotAPIServer
+from habits.utils import chunked
+
+BENCH_EMAIL_DOMAIN = "bench.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк конвейера напоминаний: засевает привычки пачками и прогоняет рассылку "
+        "через локальную заглушку Telegram Bot API. Запускайте на отдельной базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000", help="Размеры набора привычек через запятую")
+        parser.add_argument(
+            "--habits-per-user",
+            type=int,
+            default=1,
+            help="Привычек на пользователя: несколько привычек в один чат упираются в лимит чата",
+        )
+        parser.add_argument("--digest", action="store_true", help="Режим дайджеста: одно сообщение на чат")
+        parser.add_argument("--shards", type=int, default=1, help="Число шардов, обрабатываемых по очереди")
+        parser.add_argument("--global-rate", type=float, default=1000, help="Лимит сообщений в секунду на бота")
+        parser.add_argument("--concurrency", type=int, default=16, help="Параллельных отправок")
+        parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа заглушки, с")
+        parser.add_argument("--rate-limit-every", type=int, default=0, help="Отвечать 429 на каждый N-й запрос")
+        parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, с")
+        parser.add_argument("--output", default="bench_reminders.json", help="Файл для результатов в JSON")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        report = new_report(
+            {
+                key: options[key]
+                for key in (
+                    "habits_per_user",
+                    "shards",
+                    "global_rate",
+                    "concurrency",
+                    "latency",
+                    "rate_limit_every",
+                    "retry_after",
+                )
+            }
+        )
+        for size in sizes:
+            self.cleanup()
+            try:
+                self.stdout.write(f"Засеваем {size} привычек...")
+                seed_seconds = self.seed(size, options["habits_per_user"])
+                result = self.run_pipeline(size, options)
+                result["seed_seconds"] = round(seed_seconds, 3)
+            finally:
+                self.cleanup()
+            report["results"].append(result)
+            self.stdout.write(
+                f"{size}: выборка {result['scan_seconds']} с, запросов {result['queries']}, "
+                f"{result['messages_per_second']} сообщений/с, "
+                f"задержка p50 {result['lag_p50_seconds']} с, p99 {result['lag_p99_seconds']} с"
+            )
+
+        write_report(self, report, options["output"])
+
+    def seed(self, size, habits_per_user):
+        """Создаёт пользователей с профилями и привычки, срок которых уже наступил."""
+        started = time.perf_counter()
+        user_ids = seed_users(BENCH_EMAIL_DOMAIN, -(-size // habits_per_user))
+        for batch in chunked(user_ids, SEED_BATCH_SIZE):
+            Profile.objects.bulk_create([Profile(user_id=pk, telegram_chat_id=str(pk)) for pk in batch])
+
+        due_at = timezone.now().replace(second=0, microsecond=0)
+        for batch in chunked(range(size), SEED_BATCH_SIZE):
+            Habit.objects.bulk_create(
+                [
+                    Habit(
+                        user_id=user_ids[i // habits_per_user],
+                        place="Дом",
+                        time=dt_time(due_at.hour, due_at.minute),
+                        action=f"Привычка {i}",
+                        execution_time=60,
+                        next_due_at=due_at,
+                    )
+                    for i in batch
+                ]
+            )
+        return time.perf_counter() - started
+
+    def run_pipeline(self, size, options):
+        shards = options["shards"]
+        stub = StubBotAPIServer(
+            latency=options["latency"],
+            rate_limit_every=options["rate_limit_every"],
+            retry_after=options["retry_after"],
+        )
+        with stub, override_settings(
+            TELEGRAM_BOT_TOKEN="bench",
+            TELEGRAM_BASE_URL=stub.base_url,
+            TELEGRAM_GLOBAL_RATE=options["global_rate"],
+            TELEGRAM_SEND_CONCURRENCY=options["concurrency"],
+            REMINDER_SHARDS=shards,
+            REMINDER_DIGEST=options["digest"],
+        ):
+            due_before = timezone.now()
+
+            scan_started = time.perf_counter()
+            recipients = Habit.objects.filter(next_due_at__lte=due_before).reminder_recipients()
+            scanned = sum(1 for _ in recipients.iterator(chunk_size=2000))
+            scan_seconds = time.perf_counter() - scan_started
+
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    shard_results = [
+                        send_reminder_shard(due_before.isoformat(), shard, shards) for shard in range(shards)
+                    ]
+                elapsed = time.perf_counter() - started
+            finally:
+                # Клиент процесса держит соединения с заглушкой, которая сейчас остановится
+                close_client()
+
+        sent = sum(result["sent"] for result in shard_results)
+        lags = sorted(received_at - started_at for _, received_at in stub.received)
+        return {
+            "size": size,
+            "scanned": scanned,
+            "scan_seconds": round(scan_seconds, 3),
+            "queries": len(queries),
+            "sent": sent,
+            "failed": sum(result["failed"] for result in shard_results),
+            "rate_limited": stub.rate_limited,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(sent / elapsed, 1) if elapsed else None,
+            "lag_p50_seconds": round(percentile(lags, 0.50), 3) if lags else None,
+            "lag_p99_seconds": round(percentile(lags, 0.99), 3) if lags else None,
+        }
+
+    def cleanup(self):
+        delete_bench_users(BENCH_EMAIL_DOMAIN)
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import telegram
+from django.core.management.base import BaseCommand
+from telegram.request import HTTPXRequest
+
+from habits.dispatch import ReminderDispatcher, ReminderMessage
+from habits.telegram_stub import StubBotAPIServer
+
+
+class Command(BaseCommand):
+    help = "Замер пропускной способности рассылки напоминаний на локальной заглушке Bot API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=1000, help="Количество сообщений")
+        parser.add_argument("--chats", type=int, default=1000, help="Количество разных чатов")
+        parser.add_argument("--concurrency", type=int, default=16, help="Параллельных отправок")
+        parser.add_argument("--global-rate", type=float, default=30, help="Сообщений в секунду на бота")
+        parser.add_argument("--chat-rate", type=float, default=1, help="Сообщений в секунду в один чат")
+        parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа заглушки, с")
+        parser.add_argument("--rate-limit-every", type=int, default=0, help="Отвечать 429 на каждый N-й запрос")
+
+    def handle(self, *args, **options):
+        messages = [
+            ReminderMessage(i, str(1000 + i % options["chats"]), f"Напоминание №{i}")
+            for i in range(options["messages"])
+        ]
+        with StubBotAPIServer(
+            latency=options["latency"], rate_limit_every=options["rate_limit_every"]
+        ) as stub:
+            started = time.perf_counter()
+            results = asyncio.run(self._run(stub, messages, options))
+            elapsed = time.perf_counter() - started
+
+        sent = sum(result.ok for result in results)
+        self.stdout.write(
+            f"Отправлено: {sent}/{len(messages)} за {elapsed:.2f} с "
+            f"({sent / elapsed:.1f} сообщений/с), ответов 429: {stub.rate_limited}"
+        )
+
+    async def _run(self, stub, messages, options):
+        bot = telegram.Bot(
+            token="bench",
+            base_url=stub.base_url,
+            request=HTTPXRequest(connection_pool_size=options["concurrency"]),
+        )
+        dispatcher = ReminderDispatcher(
+            bot,
+            concurrency=options["concurrency"],
+            global_rate=options["global_rate"],
+            chat_rate=options["chat_rate"],
+        )
+        async with bot:
+            return await dispatcher.send_all(messages)
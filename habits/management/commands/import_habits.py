@@ -0,0 +1,64 @@
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.importer import PARSERS, HabitImporter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Импорт привычек пользователя из файла NDJSON или CSV порциями через bulk_create или COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл с привычками")
+        parser.add_argument("--user", required=True, help="Email владельца привычек")
+        parser.add_argument("--format", choices=sorted(PARSERS), help="Формат файла, по умолчанию по расширению")
+        parser.add_argument("--batch-size", type=int, help="Строк в одной порции")
+        parser.add_argument(
+            "--copy", action="store_true", default=None, help="Писать через COPY (по умолчанию на PostgreSQL)"
+        )
+        parser.add_argument("--no-copy", action="store_false", dest="copy", help="Писать через bulk_create")
+        parser.add_argument("--errors", help="Файл для ошибок строк в NDJSON")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        fmt = options["format"] or path.suffix.lstrip(".").lower()
+        if fmt not in PARSERS:
+            raise CommandError(f"Не удалось определить формат файла {path}, укажите --format")
+        try:
+            user = User.objects.get(email=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        started = time.perf_counter()
+
+        def progress(result, line_no):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Строка {line_no}: записано {result.imported}, отклонено {result.failed} "
+                f"({result.imported / elapsed:.0f} строк/с)"
+            )
+
+        importer = HabitImporter(
+            user, batch_size=options["batch_size"], use_copy=options["copy"], progress=progress, max_errors=None
+        )
+        with path.open(encoding="utf-8", newline="") as lines:
+            result = importer.run(lines, fmt)
+
+        if options["errors"] and result.errors:
+            with open(options["errors"], "w", encoding="utf-8") as errors_file:
+                for error in result.errors:
+                    errors_file.write(json.dumps(error, ensure_ascii=False) + "\n")
+        else:
+            for error in result.errors[:20]:
+                self.stderr.write(f"Строка {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импорт завершён за {time.perf_counter() - started:.1f} с: "
+                f"записано {result.imported}, отклонено {result.failed}"
+            )
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+
+def fill_time_bucket(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    # Один UPDATE в базе: строки таблицы не читаются в память
+    Habit.objects.update(time_bucket=ExtractHour("time") * 60 + ExtractMinute("time"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0002_alter_profile_user"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="time_bucket",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="Минута суток напоминания"
+            ),
+        ),
+        migrations.RunPython(fill_time_bucket, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                fields=["time_bucket"],
+                include=("user", "action", "place"),
+                name="habit_time_bucket_idx",
+            ),
+        ),
+    ]
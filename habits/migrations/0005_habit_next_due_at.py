@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:20
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def fill_next_due_at(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    now = timezone.localtime().replace(second=0, microsecond=0)
+    # Таблица читается порциями: в памяти не больше BATCH_SIZE привычек
+    habits = []
+    for habit in Habit.objects.only("id", "time").iterator(chunk_size=BATCH_SIZE):
+        due_at = timezone.make_aware(datetime.combine(now.date(), habit.time))
+        if due_at < now:
+            due_at = timezone.make_aware(
+                datetime.combine(now.date() + timedelta(days=1), habit.time)
+            )
+        habit.next_due_at = due_at
+        habits.append(habit)
+        if len(habits) == BATCH_SIZE:
+            Habit.objects.bulk_update(habits, ["next_due_at"])
+            habits = []
+    Habit.objects.bulk_update(habits, ["next_due_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0004_reminderdelivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="next_due_at",
+            field=models.DateTimeField(
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="Следующее напоминание",
+            ),
+        ),
+        migrations.RunPython(fill_next_due_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:45
+
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+import habits.validators
+
+
+def fill_utc_time_bucket(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    # Один UPDATE в базе: строки таблицы не читаются в память
+    Habit.objects.exclude(next_due_at=None).update(
+        time_bucket=ExtractHour("next_due_at", tzinfo=timezone.utc) * 60
+        + ExtractMinute("next_due_at", tzinfo=timezone.utc)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_habit_next_due_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="timezone",
+            field=models.CharField(
+                default="Europe/Moscow",
+                max_length=64,
+                validators=[habits.validators.validate_timezone],
+                verbose_name="Часовой пояс",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="time_bucket",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="Минута суток напоминания (UTC)"
+            ),
+        ),
+        migrations.RunPython(fill_utc_time_bucket, migrations.RunPython.noop),
+    ]
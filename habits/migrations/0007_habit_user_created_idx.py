@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_profile_timezone"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="habit",
+            options={
+                "ordering": ["-created_at", "-id"],
+                "verbose_name": "Привычка",
+                "verbose_name_plural": "Привычки",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="habit_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_habit_public_feed_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reminderdelivery",
+            name="habit",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deliveries",
+                to="habits.habit",
+                verbose_name="Привычка",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(fields=["timezone"], name="profile_timezone_idx"),
+        ),
+    ]
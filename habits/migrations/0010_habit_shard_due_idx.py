@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:40
+
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_query_plan_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                django.db.models.functions.math.Mod("user", 64),
+                models.F("next_due_at"),
+                name="habit_shard_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0010_habit_shard_due_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="habit",
+            name="habit_time_bucket_idx",
+        ),
+        migrations.RemoveField(
+            model_name="habit",
+            name="time_bucket",
+        ),
+    ]
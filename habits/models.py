@@ -1,16 +1,165 @@
+import zoneinfo
+from datetime import datetime, timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
 from .validators import (
     validate_execution_time,
     validate_periodicity,
     validate_pleasant_habit,
     validate_related_habit_is_pleasant,
     validate_reward_and_related_habit,
+    validate_timezone,
 )
 from django.core.exceptions import ValidationError
+from .cache import invalidate_user_habits
+from .utils import chunked
 
 User = get_user_model()
 
+# Слотов шардирования рассылки: число входит в индекс habit_shard_due_idx и меняется только миграцией
+REMINDER_SHARD_SLOTS = 64
+
+
+def get_user_timezone(user_id):
+    """Часовой пояс пользователя из профиля или часовой пояс проекта."""
+    name = Profile.objects.filter(user_id=user_id).values_list("timezone", flat=True).first()
+    return zoneinfo.ZoneInfo(name or settings.TIME_ZONE)
+
+
+def compute_next_due_at(time, tz, now=None):
+    """Ближайший момент времени выполнения по часам пользователя, начиная с текущей минуты."""
+    now = timezone.localtime(now, tz).replace(second=0, microsecond=0)
+    due_at = timezone.make_aware(datetime.combine(now.date(), time), tz)
+    if due_at < now:
+        due_at = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), time), tz)
+    return due_at
+
+
+def reschedule_due_at(due_at, time, tz, now=None):
+    """Пересчитывает срок в новом часовом поясе, сохраняя день периода."""
+    due_date = timezone.localtime(due_at, tz).date()
+    rescheduled = timezone.make_aware(datetime.combine(due_date, time), tz)
+    if rescheduled < timezone.localtime(now, tz).replace(second=0, microsecond=0):
+        return compute_next_due_at(time, tz, now)
+    return rescheduled
+
+
+def advance_due_at(due_at, periodicity, tz, now=None):
+    """Следующий срок через periodicity дней, пропуская сроки, которые уже прошли.
+
+    Сдвиг считается по местным часам пользователя, поэтому время напоминания
+    не уезжает при переходе на летнее время и обратно.
+    """
+    now = now or timezone.now()
+    local_due_at = timezone.localtime(due_at, tz)
+    step = 1
+    while True:
+        next_due_at = timezone.make_aware(
+            datetime.combine(local_due_at.date() + timedelta(days=periodicity * step), local_due_at.time()), tz
+        )
+        if next_due_at > now:
+            return next_due_at
+        step += 1
+
+
+class HabitQuerySet(models.QuerySet):
+    def for_shard(self, shard, shards):
+        """Привычки пользователей шарда.
+
+        Пользователь попадает в слот user_id по модулю REMINDER_SHARD_SLOTS, шарду
+        достаются слоты с остатком shard по модулю shards. Выборка идёт по индексу
+        (слот, next_due_at), поэтому каждый шард читает только свои строки, а
+        число шардов можно менять без новой миграции.
+        """
+        slots = [slot for slot in range(REMINDER_SHARD_SLOTS) if slot % shards == shard]
+        # Целый тип результата: иначе остаток сравнивается как numeric и не совпадает с выражением индекса
+        slot = Mod("user_id", REMINDER_SHARD_SLOTS, output_field=models.IntegerField())
+        return self.alias(shard_slot=slot).filter(shard_slot__in=slots)
+
+    def reschedule(self, chunk_size=2000):
+        """Пересчитывает next_due_at по текущим часовым поясам владельцев.
+
+        Нужен при смене часового пояса пользователя и при переходе на летнее
+        время: строки обновляются пачками, а ежеминутная выборка по-прежнему
+        не переводит время построчно.
+        """
+        now = timezone.now()
+        rows = (
+            self.order_by()
+            .values_list("id", "user_id", "time", "next_due_at", "user__profile__timezone")
+            .iterator(chunk_size=chunk_size)
+        )
+        updated = 0
+        for chunk in chunked(rows, chunk_size):
+            habits = []
+            for pk, user_id, time, next_due_at, tz_name in chunk:
+                tz = zoneinfo.ZoneInfo(tz_name or settings.TIME_ZONE)
+                if next_due_at is None:
+                    due_at = compute_next_due_at(time, tz, now)
+                else:
+                    due_at = reschedule_due_at(next_due_at, time, tz, now)
+                habits.append(Habit(pk=pk, next_due_at=due_at))
+            updated += Habit.objects.bulk_update(habits, ["next_due_at"])
+            user_ids = [user_id for _, user_id, *_ in chunk]
+            transaction.on_commit(lambda user_ids=user_ids: invalidate_user_habits(user_ids))
+        return updated
+
+    def related_graph(self, user_id, habit_id=None, max_depth=10):
+        """Граф связанных привычек пользователя одним рекурсивным CTE.
+
+        Связи related_habit обходятся в обе стороны от привычки habit_id или,
+        если она не задана, от всех привычек без связанной. У каждой привычки
+        в depth — число шагов от ближайшей стартовой (None, если она недостижима
+        за max_depth шагов). Путь обхода хранится строкой ",id,id,", поэтому
+        обход не заходит в циклы повторно.
+        """
+        table = self.model._meta.db_table
+        if habit_id is None:
+            start, start_params = "user_id = %s AND related_habit_id IS NULL", [user_id]
+            nodes_join = "LEFT JOIN"
+        else:
+            start, start_params = "user_id = %s AND id = %s", [user_id, habit_id]
+            nodes_join = "JOIN"
+        sql = f"""
+            WITH RECURSIVE edges(src, dst) AS (
+                SELECT id, related_habit_id FROM {table}
+                WHERE user_id = %s AND related_habit_id IS NOT NULL
+                UNION ALL
+                SELECT related_habit_id, id FROM {table}
+                WHERE user_id = %s AND related_habit_id IS NOT NULL
+            ),
+            graph(id, depth, path) AS (
+                SELECT id, 0, ',' || CAST(id AS TEXT) || ',' FROM {table} WHERE {start}
+                UNION ALL
+                SELECT edges.dst, graph.depth + 1, graph.path || CAST(edges.dst AS TEXT) || ','
+                FROM graph JOIN edges ON edges.src = graph.id
+                WHERE graph.depth < %s AND graph.path NOT LIKE '%%,' || CAST(edges.dst AS TEXT) || ',%%'
+            )
+            SELECT {table}.*, reached.depth FROM {table}
+            {nodes_join} (SELECT id, MIN(depth) AS depth FROM graph GROUP BY id) reached
+                ON reached.id = {table}.id
+            WHERE {table}.user_id = %s
+            ORDER BY reached.depth IS NULL, reached.depth, {table}.id
+        """
+        return self.raw(sql, [user_id, user_id, *start_params, max_depth, user_id])
+
+    def without_recipient(self):
+        """Привычки, напоминание которым отправить некуда: у владельца нет профиля или chat id."""
+        return self.exclude(user__profile__telegram_chat_id__gt="")
+
+    def reminder_recipients(self):
+        """Проекция для рассылки: привычка, действие, место и chat id одним JOIN-запросом."""
+        return (
+            # INNER JOIN профиля; условие > '' отсекает и NULL, и пустую строку
+            self.filter(user__profile__telegram_chat_id__gt="")
+            .order_by()
+            .values_list("id", "action", "place", "next_due_at", "user__profile__telegram_chat_id", named=True)
+        )
+
 
 class Habit(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="habits", verbose_name="Пользователь")
@@ -26,13 +175,56 @@ class Habit(models.Model):
     reward = models.CharField(max_length=255, null=True, blank=True, verbose_name="Вознаграждение")
     execution_time = models.PositiveIntegerField(verbose_name="Время на выполнение (в секундах)")
     is_public = models.BooleanField(default=False, verbose_name="Публичная привычка")
+    next_due_at = models.DateTimeField(
+        null=True, editable=False, db_index=True, verbose_name="Следующее напоминание"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
+    objects = HabitQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # Список привычек пользователя с постраничным выводом по курсору
+            models.Index(fields=["user", "-created_at", "-id"], name="habit_user_created_idx"),
+            # Публичная лента читает только публичные привычки в порядке курсора
+            models.Index(
+                fields=["-created_at", "-id"], condition=models.Q(is_public=True), name="habit_public_feed_idx"
+            ),
+            # Выборка наступивших напоминаний одного шарда рассылки
+            models.Index(Mod("user", REMINDER_SHARD_SLOTS), "next_due_at", name="habit_shard_due_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем расписание из базы, чтобы пересчитывать next_due_at только при его изменении
+        instance._loaded_schedule = (instance.__dict__.get("time"), instance.__dict__.get("periodicity"))
+        instance._loaded_is_public = instance.__dict__.get("is_public", False)
+        return instance
+
+    def sync_schedule(self, tz=None):
+        """Пересчитывает next_due_at при изменении расписания.
+
+        tz — часовой пояс владельца, если он уже известен: массовые операции
+        передают его, чтобы не читать профиль на каждую привычку.
+        """
+        time = self._meta.get_field("time").to_python(self.time)
+        schedule_changed = getattr(self, "_loaded_schedule", None) != (time, self.periodicity)
+        if self.next_due_at is None or schedule_changed:
+            self.next_due_at = compute_next_due_at(time, tz or get_user_timezone(self.user_id))
+        self._loaded_schedule = (time, self.periodicity)
+
+    def save(self, *args, **kwargs):
+        self.sync_schedule()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"time", "periodicity"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "next_due_at"}
+        super().save(*args, **kwargs)
 
     def clean(self):
         # Проверка, что приятная привычка не может иметь вознаграждение или связанную привычку
@@ -56,3 +248,75 @@ class Profile(models.Model):
     telegram_chat_id = models.CharField(
         max_length=255, blank=True, null=True, verbose_name="Telegram Chat ID"
     )
+    timezone = models.CharField(
+        max_length=64, default=settings.TIME_ZONE, validators=[validate_timezone], verbose_name="Часовой пояс"
+    )
+
+    class Meta:
+        indexes = [
+            # Пересчёт сроков после перевода часов выбирает профили по часовому поясу
+            models.Index(fields=["timezone"], name="profile_timezone_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_timezone = instance.__dict__.get("timezone")
+        return instance
+
+    def save(self, *args, **kwargs):
+        timezone_changed = getattr(self, "_loaded_timezone", settings.TIME_ZONE) != self.timezone
+        super().save(*args, **kwargs)
+        self._loaded_timezone = self.timezone
+        if timezone_changed:
+            # Сроки всех привычек пользователя пересчитываются одной пачкой
+            Habit.objects.filter(user_id=self.user_id).reschedule()
+
+
+class ReminderDelivery(models.Model):
+    """Исходящее напоминание: одна строка на привычку и запланированную минуту."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Не доставлено"),
+    ]
+
+    # Отдельный индекс по habit не нужен: его покрывает уникальное ограничение (habit, scheduled_for)
+    habit = models.ForeignKey(
+        Habit, on_delete=models.CASCADE, related_name="deliveries", db_index=False, verbose_name="Привычка"
+    )
+    scheduled_for = models.DateTimeField(verbose_name="Запланированная минута")
+    idempotency_key = models.CharField(max_length=64, unique=True, verbose_name="Ключ идемпотентности")
+    chat_id = models.CharField(max_length=255, verbose_name="Telegram Chat ID")
+    text = models.TextField(verbose_name="Текст")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток отправки")
+    next_attempt_at = models.DateTimeField(verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, default="", verbose_name="Последняя ошибка")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Отправка напоминания"
+        verbose_name_plural = "Отправки напоминаний"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "scheduled_for"], name="unique_delivery_per_minute"),
+        ]
+        indexes = [
+            # Повторные попытки выбирают только ожидающие строки
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="delivery_pending_idx",
+            ),
+        ]
+
+    @staticmethod
+    def make_idempotency_key(habit_id, scheduled_for):
+        return f"{habit_id}:{scheduled_for:%Y%m%d%H%M}"
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.status})"
@@ -0,0 +1,154 @@
+import zoneinfo
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import invalidate_user_habits
+from .dispatch import ReminderMessage
+from .models import Habit, ReminderDelivery, advance_due_at
+
+
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def build_text(recipient):
+    return f"Напоминание: {recipient.action} в {recipient.place}."
+
+
+def build_messages(deliveries, digest=False):
+    """Сообщения для строк outbox; ключ сообщения — кортеж pk строк, которые оно доставляет.
+
+    В режиме дайджеста напоминания одного чата объединяются в одно сообщение
+    (или несколько, если текст не помещается в лимит Telegram), поэтому
+    лимит в одно сообщение в секунду на чат расходуется один раз.
+    """
+    if not digest:
+        return [ReminderMessage((delivery.pk,), delivery.chat_id, delivery.text) for delivery in deliveries]
+
+    by_chat = {}
+    for delivery in deliveries:
+        by_chat.setdefault(delivery.chat_id, []).append(delivery)
+
+    messages = []
+    for chat_id, chat_deliveries in by_chat.items():
+        keys, lines = [], []
+        for delivery in chat_deliveries:
+            if lines and len("\n".join(lines + [delivery.text])) > TELEGRAM_MESSAGE_LIMIT:
+                messages.append(ReminderMessage(tuple(keys), chat_id, "\n".join(lines)))
+                keys, lines = [], []
+            keys.append(delivery.pk)
+            lines.append(delivery.text)
+        messages.append(ReminderMessage(tuple(keys), chat_id, "\n".join(lines)))
+    return messages
+
+
+def enqueue_deliveries(recipients, now):
+    """Заносит напоминания на срок next_due_at в outbox; уже существующие строки не трогает."""
+    ReminderDelivery.objects.bulk_create(
+        [
+            ReminderDelivery(
+                habit_id=recipient.id,
+                scheduled_for=recipient.next_due_at,
+                idempotency_key=ReminderDelivery.make_idempotency_key(recipient.id, recipient.next_due_at),
+                chat_id=recipient.user__profile__telegram_chat_id,
+                text=build_text(recipient),
+                next_attempt_at=now,
+            )
+            for recipient in recipients
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def claim_deliveries(queryset, now, limit):
+    """Забирает ожидающие отправки строки под аренду.
+
+    Строки блокируются с SKIP LOCKED, и их следующая попытка сдвигается на
+    REMINDER_CLAIM_LEASE секунд, поэтому параллельные задачи не отправят одно
+    напоминание дважды, а строки упавшего воркера вернутся в работу после аренды.
+    """
+    with transaction.atomic():
+        deliveries = list(
+            queryset.filter(status=ReminderDelivery.STATUS_PENDING, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .only("id", "habit_id", "scheduled_for", "chat_id", "text", "status", "attempts", "next_attempt_at")[:limit]
+        )
+        ReminderDelivery.objects.filter(pk__in=[delivery.pk for delivery in deliveries]).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + timedelta(seconds=settings.REMINDER_CLAIM_LEASE),
+        )
+    for delivery in deliveries:
+        delivery.attempts += 1
+    return deliveries
+
+
+def record_results(deliveries, results, now):
+    """Отмечает отправленные строки, неудачным назначает следующую попытку с экспоненциальной паузой.
+
+    Результат сообщения относится ко всем строкам из его ключа. Завершённые
+    строки и перенос сроков их привычек записываются в одной транзакции.
+    """
+    by_pk = {delivery.pk: delivery for delivery in deliveries}
+    sent, failed = [], []
+    for result in results:
+        for pk in result.key:
+            delivery = by_pk[pk]
+            if result.ok:
+                sent.append(delivery.pk)
+                continue
+            delivery.last_error = result.error or ""
+            if delivery.attempts >= settings.REMINDER_MAX_ATTEMPTS:
+                delivery.status = ReminderDelivery.STATUS_FAILED
+            else:
+                backoff = settings.REMINDER_RETRY_BACKOFF * 2 ** (delivery.attempts - 1)
+                delivery.next_attempt_at = now + timedelta(seconds=backoff)
+            failed.append(delivery)
+
+    # Статусы и сдвиг сроков пишутся вместе: иначе после сбоя между ними строка уже отправлена,
+    # а next_due_at остаётся в прошлом, и привычка больше не попадёт ни в outbox, ни в рассылку
+    with transaction.atomic():
+        if sent:
+            ReminderDelivery.objects.filter(pk__in=sent).update(status=ReminderDelivery.STATUS_SENT, sent_at=now)
+        if failed:
+            ReminderDelivery.objects.bulk_update(failed, ["status", "next_attempt_at", "last_error"])
+        advance_habits(
+            [by_pk[pk] for pk in sent] + [d for d in failed if d.status == ReminderDelivery.STATUS_FAILED], now
+        )
+    return len(sent), failed
+
+
+def advance_habits(deliveries, now):
+    """Переносит next_due_at привычек с завершёнными отправками на следующий период."""
+    advance_due({(delivery.habit_id, delivery.scheduled_for) for delivery in deliveries}, now)
+
+
+def advance_due(due, now):
+    """Переносит next_due_at привычек из пар (id, срок) на следующий период.
+
+    Срок сдвигается по часам пользователя. Привычки, чьё расписание успели
+    изменить после того, как срок был прочитан, не трогаются.
+    """
+    if not due:
+        return
+    with transaction.atomic():
+        rows = (
+            Habit.objects.filter(pk__in={habit_id for habit_id, _ in due})
+            .select_for_update(of=("self",))
+            .order_by()
+            .values_list("id", "user_id", "next_due_at", "periodicity", "user__profile__timezone")
+        )
+        habits, user_ids = [], []
+        for pk, user_id, next_due_at, periodicity, tz_name in rows:
+            if (pk, next_due_at) not in due:
+                continue
+            user_ids.append(user_id)
+            tz = zoneinfo.ZoneInfo(tz_name or settings.TIME_ZONE)
+            due_at = advance_due_at(next_due_at, periodicity, tz, now)
+            habits.append(Habit(pk=pk, next_due_at=due_at))
+        Habit.objects.bulk_update(habits, ["next_due_at"])
+        # Срок напоминания входит в ответы API, поэтому ETag владельцев меняется
+        transaction.on_commit(lambda: invalidate_user_habits(user_ids))
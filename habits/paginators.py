@@ -0,0 +1,125 @@
+from base64 import b64encode
+from datetime import datetime
+from urllib import parse
+
+from django.db import models
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class Row(models.Func):
+    """Значение строки (a, b): сравнение кортежей целиком, а не по первому полю."""
+
+    function = ""
+    template = "(%(expressions)s)"
+    output_field = models.Field()
+
+
+class HabitCursorPagination(CursorPagination):
+    """Постраничный вывод привычек по курсору (created_at, id).
+
+    В отличие от номеров страниц не выполняет COUNT(*) и OFFSET: курсор хранит
+    created_at и id последней строки, и следующая страница читается условием
+    (created_at, id) < (%s, %s) из индекса (user, -created_at, -id). Поэтому
+    глубокие страницы не медленнее первой, а привычки с одинаковым created_at
+    (например, из одного импорта) тоже листаются без OFFSET.
+    """
+
+    ordering = ("-created_at", "-id")
+    cursor_fields = ("created_at", "id")
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        return self.paginate_rows(list(page_queryset))
+
+    def page_queryset(self, queryset, request):
+        """Запрос страницы от позиции курсора с одной лишней строкой; None, если пагинация выключена."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor.reverse
+
+        if self.reverse:
+            # Предыдущая страница читается в обратном порядке и разворачивается в paginate_rows
+            queryset = queryset.order_by(*self.cursor_fields)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            created_at, pk = self.parse_position(self.cursor.position)
+            position = Row(models.Value(created_at, output_field=models.DateTimeField()), models.Value(pk))
+            compare = GreaterThan if self.reverse else LessThan
+            queryset = queryset.filter(compare(Row(*map(models.F, self.cursor_fields)), position))
+        return queryset[: self.page_size + 1]
+
+    def paginate_rows(self, rows):
+        """Страница из строк page_queryset; запоминает позиции для ссылок на соседние страницы."""
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        if not self.page:
+            self.has_next = self.has_previous = False
+        else:
+            self.previous_position = self.get_position(self.page[0])
+            self.next_position = self.get_position(self.page[-1])
+        return self.page
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            created_at, pk = (row[name] for name in self.cursor_fields)
+        else:
+            created_at, pk = row.created_at, row.pk
+        return f"{created_at.isoformat()}|{pk}"
+
+    def parse_position(self, position):
+        try:
+            created_at, pk = position.split("|")
+            return datetime.fromisoformat(created_at), int(pk)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def cursor_token(self, cursor):
+        """Значение параметра cursor, как его кодирует encode_cursor DRF, но без адреса запроса."""
+        tokens = {"p": cursor.position}
+        if cursor.reverse:
+            tokens["r"] = "1"
+        return b64encode(parse.urlencode(tokens).encode("ascii")).decode("ascii")
+
+    def cursor_link(self, token):
+        if token is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def encode_cursor(self, cursor):
+        return self.cursor_link(self.cursor_token(cursor))
+
+    def get_page_cursors(self):
+        """Курсоры соседних страниц без адреса запроса: их можно хранить в общем кеше вместе со страницей."""
+        return {
+            "next": self.cursor_token(Cursor(0, False, self.next_position)) if self.has_next else None,
+            "previous": self.cursor_token(Cursor(0, True, self.previous_position)) if self.has_previous else None,
+        }
+
+    def get_next_link(self):
+        return self.cursor_link(self.get_page_cursors()["next"])
+
+    def get_previous_link(self):
+        return self.cursor_link(self.get_page_cursors()["previous"])
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный paginate_queryset: страница читается через aiterator() без потока на всё время запроса."""
+        page_queryset = self.page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        return self.paginate_rows([row async for row in page_queryset.aiterator()])
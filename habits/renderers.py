@@ -0,0 +1,28 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него работает стандартный JSONRenderer
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON через orjson, если он установлен.
+
+    Вывод побайтно совпадает с компактным JSONRenderer DRF для данных
+    сериализаторов: без пробелов и с символами UTF-8 без экранирования.
+    Запросы с отступами (indent в Accept) и данные, которые orjson не
+    принимает, рендерятся стандартным способом.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if "\u2028".encode() in ret or "\u2029".encode() in ret:
+            # DRF экранирует разделители строк для встраивания JSON в JavaScript
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret
@@ -1,11 +1,38 @@
+import copy
+from datetime import datetime
+
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
 from .models import Habit
 
 
 class HabitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Habit
-        fields = '__all__'
+        # Служебный срок напоминания next_due_at в API не выводится
+        fields = [
+            'id',
+            'user',
+            'place',
+            'time',
+            'action',
+            'is_pleasant',
+            'related_habit',
+            'periodicity',
+            'reward',
+            'execution_time',
+            'is_public',
+            'created_at',
+            'updated_at',
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields — разреженный набор полей для вывода; None — все поля
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def validate(self, data):
         # Проверка на приятную привычку с вознаграждением или связанной привычкой
@@ -25,3 +52,119 @@ class HabitSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Связанная привычка должна быть приятной привычкой.")
 
         return data
+
+
+class PrefetchedHabitField(serializers.PrimaryKeyRelatedField):
+    """Связанная привычка из словаря context["related_habits"], загруженного одним запросом на пакет."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        habit = self.context["related_habits"].get(pk)
+        if habit is None:
+            self.fail("does_not_exist", pk_value=data)
+        return habit
+
+
+class BulkHabitSerializer(HabitSerializer):
+    """Сериализатор одного элемента массовых операций: владелец берётся из запроса."""
+
+    related_habit = PrefetchedHabitField(queryset=Habit.objects.all(), allow_null=True, required=False)
+
+    class Meta(HabitSerializer.Meta):
+        read_only_fields = ["user"]
+
+
+class ValuesSerializer:
+    """Быстрая сериализация строк values() для чтения списком.
+
+    Поля serializer_class разбираются один раз: для каждого запоминаются
+    колонка и функция вывода. Строки и числа из базы уже имеют нужный тип и
+    выводятся как есть, остальные поля (даты, время) идут через to_representation
+    поля DRF, поэтому результат совпадает с serializer_class(many=True).data,
+    но без модельных объектов и копий полей на каждую строку.
+    """
+
+    # Поля, для которых значение из базы уже совпадает с выводом DRF
+    PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+    def __init__(self, serializer_class):
+        self.mapping = []
+        for field in serializer_class()._readable_fields:
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                # values() отдаёт по имени связи сам первичный ключ
+                represent = None
+            elif isinstance(field, self.PASSTHROUGH_FIELDS) and type(field).to_representation in (
+                serializers.CharField.to_representation,
+                serializers.IntegerField.to_representation,
+                serializers.BooleanField.to_representation,
+            ):
+                represent = None
+            else:
+                represent = field.to_representation
+            self.mapping.append((field.field_name, field.source, represent))
+        self.columns = [source for _, source, _ in self.mapping]
+        self.field_names = [name for name, _, _ in self.mapping]
+
+    def only(self, field_names):
+        """Копия для разреженного набора полей: выводятся и читаются из базы только field_names."""
+        subset = copy.copy(self)
+        subset.mapping = [item for item in self.mapping if item[0] in field_names]
+        subset.columns = [source for _, source, _ in subset.mapping]
+        subset.field_names = [name for name, _, _ in subset.mapping]
+        return subset
+
+    def values(self, queryset, *extra):
+        """Строки values() с колонками полей и extra (например, полем курсора пагинации)."""
+        return queryset.values(*dict.fromkeys([*self.columns, *extra]))
+
+    def compile(self):
+        """Функции вывода на один вызов to_representation.
+
+        Часовой пояс DateTimeField берётся один раз, а не на каждое значение:
+        на длинных списках его поиск занимает больше времени, чем сам вывод даты.
+        """
+        mapping = []
+        for name, source, represent in self.mapping:
+            field = getattr(represent, "__self__", None)
+            if isinstance(field, serializers.DateTimeField):
+                output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+                tz = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+                if output_format is not None and output_format.lower() == ISO_8601 and tz is not None:
+                    represent = datetime_representation(field, tz)
+            mapping.append((name, source, represent))
+        return mapping
+
+    def to_representation(self, rows):
+        mapping = self.compile()
+        return [
+            {
+                name: value if (value := row[source]) is None or represent is None else represent(value)
+                for name, source, represent in mapping
+            }
+            for row in rows
+        ]
+
+
+def datetime_representation(field, tz):
+    """Вывод DateTimeField в ISO 8601 в заданном часовом поясе, как в DRF."""
+
+    def represent(value):
+        if not isinstance(value, datetime) or not timezone.is_aware(value):
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(tz).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return represent
+
+
+habit_values_serializer = ValuesSerializer(HabitSerializer)
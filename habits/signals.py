@@ -1,7 +1,9 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Profile
+from .cache import invalidate_public_feed, invalidate_user_habits
+from .models import Habit, Profile
 
 
 @receiver(post_save, sender=User)
@@ -11,3 +13,15 @@ def create_user_profile(sender, instance, created, **kwargs):
         # Проверяем, существует ли уже профиль для этого пользователя
         if not hasattr(instance, 'profile'):
             Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def invalidate_habit_caches(sender, instance, **kwargs):
+    """Сброс ETag привычек владельца и кеша публичной ленты, если привычка публичная или была ею."""
+    was_public = getattr(instance, "_loaded_is_public", False)
+    instance._loaded_is_public = instance.is_public
+    # После коммита: иначе параллельный запрос успеет закешировать старые данные
+    transaction.on_commit(lambda: invalidate_user_habits([instance.user_id]))
+    if instance.is_public or was_public:
+        transaction.on_commit(invalidate_public_feed)
@@ -1,36 +1,217 @@
 import logging
-from celery import shared_task
+import zoneinfo
+from datetime import datetime, timedelta
+from itertools import chain
+from celery import chord, shared_task
 from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
-import telegram
-from time import sleep
-from .models import Habit
+from .dispatch import ReminderDispatcher
+from .models import Habit, Profile, ReminderDelivery
+from .outbox import advance_due, build_messages, claim_deliveries, enqueue_deliveries, record_results
+from .telegram_client import get_client
+from .utils import chunked
 
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def send_habit_reminders(self):
-    """Отправка уведомлений о привычках через Telegram с повторными попытками."""
-    bot = telegram.Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    current_time = timezone.now().time()
-
-    habits = Habit.objects.filter(time=current_time)
-    for habit in habits:
-        if habit.user.profile.telegram_chat_id:
-            try:
-                message = f"Напоминание: {habit.action} в {habit.place}."
-                bot.send_message(
-                    chat_id=habit.user.profile.telegram_chat_id, text=message
-                )
-            except telegram.error.TelegramError as e:
-                # Логируем ошибку, если произошла ошибка Telegram API
-                logger.error(f"Ошибка отправки уведомления для {habit.user.username}: {e}")
-                # Пробуем снова через несколько секунд
-                self.retry(countdown=60)
-            except Exception as e:
-                # Логируем все остальные ошибки
-                logger.error(f"Ошибка при отправке уведомления для {habit.user.username}: {e}")
-                # В случае другого исключения, мы не пытаемся повторить, а продолжаем цикл
-                continue
+
+def get_dispatcher(bot, global_rate=None):
+    """Диспетчер рассылки с лимитами из настроек."""
+    return ReminderDispatcher(
+        bot,
+        concurrency=settings.TELEGRAM_SEND_CONCURRENCY,
+        global_rate=global_rate or settings.TELEGRAM_GLOBAL_RATE,
+        chat_rate=settings.TELEGRAM_CHAT_RATE,
+        max_retries=settings.TELEGRAM_MAX_RETRIES,
+    )
+
+
+def shard_global_rate():
+    """Доля общего лимита Telegram на одну задачу рассылки.
+
+    Шарды и повтор неудачных отправок работают одновременно, поэтому лимит
+    делится на REMINDER_SHARDS + 1 частей.
+    """
+    return settings.TELEGRAM_GLOBAL_RATE / (settings.REMINDER_SHARDS + 1)
+
+
+# Доля аренды, за которую порция должна успеть уйти: запас на ответы Bot API и паузы retry_after
+CLAIM_LEASE_SHARE = 0.5
+
+
+def claim_limit(global_rate, chunk_size):
+    """Сколько строк outbox забирать за раз, чтобы порция ушла раньше, чем истечёт её аренда.
+
+    Результаты записываются после отправки всей порции; если она идёт дольше
+    REMINDER_CLAIM_LEASE, повтор или следующий запуск заберут ещё не
+    отмеченные строки и отправят их второй раз.
+    """
+    return max(1, min(chunk_size, int(settings.REMINDER_CLAIM_LEASE * global_rate * CLAIM_LEASE_SHARE)))
+
+
+def send_batches(batches, global_rate=None):
+    """Отправляет порции строк outbox и записывает результаты каждой строки.
+
+    Запросы к базе и отправка чередуются в одном потоке: очередная порция
+    готовится, пока цикл событий остановлен, поэтому ORM не вызывается из
+    асинхронного контекста. Клиент Bot API и его пул соединений общие для
+    всех запусков в процессе воркера.
+    Возвращает число отправленных и список неудачных строк.
+    """
+    sent, failed = 0, []
+    batches = iter(batches)
+    first_batch = next(batches, None)
+    if first_batch is None:
+        return sent, failed
+
+    client = get_client()
+    dispatcher = get_dispatcher(client.bot, global_rate)
+    for deliveries in chain([first_batch], batches):
+        messages = build_messages(deliveries, digest=settings.REMINDER_DIGEST)
+        results = client.run(dispatcher.send_all(messages))
+        batch_sent, batch_failed = record_results(deliveries, results, timezone.now())
+        sent += batch_sent
+        failed.extend(batch_failed)
+    return sent, failed
+
+
+def shard_batches(due_before, shard, shards, chunk_size, claim_size):
+    """Заносит наступившие напоминания шарда в outbox и отдаёт их на отправку порциями.
+
+    Получатели читаются по chunk_size, а строки outbox забираются по
+    claim_size непосредственно перед отправкой, чтобы аренда не истекла
+    раньше, чем записан результат.
+    """
+    recipients = Habit.objects.filter(next_due_at__lte=due_before).for_shard(shard, shards).reminder_recipients()
+    if settings.REMINDER_DIGEST:
+        # Привычки одного пользователя идут подряд и попадают в одну порцию, кроме стыков порций
+        recipients = recipients.order_by("user_id")
+    # На PostgreSQL iterator() читает через серверный курсор порциями по chunk_size
+    recipients = recipients.iterator(chunk_size=chunk_size)
+    for chunk in chunked(recipients, chunk_size):
+        now = timezone.now()
+        enqueue_deliveries(chunk, now)
+        # Уже отправленные и ждущие паузы перед повтором строки не попадут в выборку
+        pending = ReminderDelivery.objects.filter(habit_id__in=[recipient.id for recipient in chunk])
+        while deliveries := claim_deliveries(pending, timezone.now(), claim_size):
+            yield deliveries
+
+
+def skip_unreachable(due_before, shard, shards, chunk_size):
+    """Переносит на следующий период наступившие привычки шарда, которым некуда слать напоминание.
+
+    Иначе их next_due_at навсегда остаётся в прошлом: каждый запуск заново
+    читает их в выборке next_due_at <= now, а после появления chat id
+    пользователь получает давно устаревшее напоминание.
+    """
+    rows = (
+        Habit.objects.filter(next_due_at__lte=due_before)
+        .for_shard(shard, shards)
+        .without_recipient()
+        .order_by()
+        .values_list("id", "next_due_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    skipped = 0
+    for chunk in chunked(rows, chunk_size):
+        advance_due(set(chunk), timezone.now())
+        skipped += len(chunk)
+    return skipped
+
+
+def log_failures(failed):
+    for delivery in failed:
+        logger.error(
+            f"Ошибка отправки уведомления для привычки {delivery.habit_id} "
+            f"(попытка {delivery.attempts}): {delivery.last_error}"
+        )
+
+
+@shared_task
+def send_habit_reminders():
+    """Координатор рассылки: делит наступившие напоминания на шарды.
+
+    Шарды отправляются группой задач на разные воркеры, итоговые счётчики
+    собирает collect_reminder_results.
+    """
+    # Выборка по индексу next_due_at <= now: запуск beat с опозданием ничего не
+    # пропускает, а привычки, срок которых не наступил, не читаются вовсе
+    due_before = timezone.now().isoformat()
+    shards = settings.REMINDER_SHARDS
+    result = chord(
+        send_reminder_shard.s(due_before, shard, shards) for shard in range(shards)
+    )(collect_reminder_results.s(due_before))
+    return result.id
+
+
+@shared_task
+def send_reminder_shard(due_before, shard, shards):
+    """Отправка уведомлений одного шарда через outbox.
+
+    Неудачные отправки остаются в outbox и повторяются задачей
+    retry_reminder_deliveries, поэтому задача шарда целиком не перезапускается.
+    Сроки наступивших привычек без chat id переносятся без отправки.
+    """
+    due_before = datetime.fromisoformat(due_before)
+    global_rate = shard_global_rate()
+    chunk_size = settings.REMINDER_CHUNK_SIZE
+    skip_unreachable(due_before, shard, shards, chunk_size)
+    sent, failed = send_batches(
+        shard_batches(due_before, shard, shards, chunk_size, claim_limit(global_rate, chunk_size)), global_rate
+    )
+    log_failures(failed)
+    return {"shard": shard, "sent": sent, "failed": len(failed)}
+
+
+@shared_task
+def collect_reminder_results(results, due_before):
+    """Сводит счётчики отправленных и неудачных напоминаний по шардам."""
+    sent = sum(result["sent"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    logger.info(f"Напоминания на {due_before}: отправлено {sent}, ошибок {failed}, шардов {len(results)}")
+    return {"due_before": due_before, "sent": sent, "failed": failed, "shards": results}
+
+
+@shared_task
+def retry_reminder_deliveries():
+    """Повторная отправка только тех напоминаний, чья очередная попытка уже наступила."""
+    global_rate = shard_global_rate()
+    claim_size = claim_limit(global_rate, settings.REMINDER_CHUNK_SIZE)
+
+    def batches():
+        while deliveries := claim_deliveries(ReminderDelivery.objects.all(), timezone.now(), claim_size):
+            yield deliveries
+
+    sent, failed = send_batches(batches(), global_rate)
+    log_failures(failed)
+    return {"sent": sent, "failed": len(failed)}
+
+
+def zones_with_offset_change(zone_names, now):
+    """Часовые пояса, у которых смещение от UTC меняется в пределах суток от now."""
+    changed = set()
+    for name in zone_names:
+        tz = zoneinfo.ZoneInfo(name)
+        offsets = {(now + timedelta(days=shift)).astimezone(tz).utcoffset() for shift in (-1, 0, 1)}
+        if len(offsets) > 1:
+            changed.add(name)
+    return changed
+
+
+@shared_task
+def refresh_dst_schedules():
+    """Пересчёт сроков напоминаний в часовых поясах, где переводят часы."""
+    zone_names = set(Profile.objects.values_list("timezone", flat=True).distinct()) | {settings.TIME_ZONE}
+    changed = zones_with_offset_change(zone_names, timezone.now())
+    if not changed:
+        return 0
+
+    habits = Q(user__profile__timezone__in=changed)
+    if settings.TIME_ZONE in changed:
+        # Пользователи без профиля живут в часовом поясе проекта
+        habits |= Q(user__profile__isnull=True)
+    updated = Habit.objects.filter(habits).reschedule()
+    logger.info(f"Сроки напоминаний пересчитаны после перевода часов: {updated} (пояса: {', '.join(sorted(changed))})")
+    return updated
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+
+import httpx
+import telegram
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from django.conf import settings
+from telegram.request import HTTPXRequest
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+class BotClient:
+    """Клиент Bot API процесса воркера вместе со своим циклом событий.
+
+    Соединения httpx привязаны к циклу, в котором открыты, поэтому цикл живёт
+    столько же, сколько клиент, и соединения переживают запуски задач.
+    """
+
+    def __init__(self, token, base_url, pool_size, keepalive_expiry):
+        self.config = (token, base_url, pool_size, keepalive_expiry)
+        self.runner = asyncio.Runner()
+        self.bot = telegram.Bot(
+            token=token,
+            base_url=base_url,
+            request=HTTPXRequest(
+                connection_pool_size=pool_size,
+                httpx_kwargs={
+                    "limits": httpx.Limits(
+                        max_connections=pool_size,
+                        max_keepalive_connections=pool_size,
+                        keepalive_expiry=keepalive_expiry,
+                    )
+                },
+            ),
+        )
+        self.run(self.bot.initialize())
+
+    def run(self, coro):
+        return self.runner.run(coro)
+
+    def close(self):
+        try:
+            self.run(self.bot.shutdown())
+        finally:
+            self.runner.close()
+
+
+def client_config():
+    return (
+        settings.TELEGRAM_BOT_TOKEN,
+        settings.TELEGRAM_BASE_URL,
+        settings.TELEGRAM_CONNECTION_POOL_SIZE,
+        settings.TELEGRAM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_client():
+    """Клиент Bot API текущего процесса; создаётся при первом обращении.
+
+    Если настройки подключения изменились, старый клиент закрывается.
+    Рассчитан на воркеры prefork и solo, где задачи процесса идут по одной.
+    """
+    global _client
+    config = client_config()
+    if _client is not None and _client.config != config:
+        close_client()
+    if _client is None:
+        _client = BotClient(*config)
+    return _client
+
+
+def close_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+@worker_process_init.connect
+def init_worker_client(**kwargs):
+    # Клиент создаётся после fork: сокеты и цикл событий не должны делиться между процессами
+    try:
+        get_client()
+    except Exception as e:
+        # Без токена или связи клиент будет создан при первой рассылке
+        logger.warning(f"Клиент Telegram не инициализирован при старте воркера: {e!r}")
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_worker_client(**kwargs):
+    try:
+        close_client()
+    except Exception as e:
+        logger.warning(f"Ошибка при закрытии клиента Telegram: {e!r}")
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+
+class StubBotAPIServer:
+    """Локальная заглушка Telegram Bot API для бенчмарков рассылки.
+
+    Отвечает на getMe и sendMessage, может добавлять задержку к каждому ответу
+    и возвращать 429 с retry_after на каждый rate_limit_every-й запрос.
+    Время получения каждого sendMessage сохраняется в received, число
+    принятых TCP-соединений — в connections.
+
+    Сервер работает на asyncio в отдельном потоке: потоковый http.server
+    с десятками соединений упирается в GIL и сам становится узким местом.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.received = []
+        self.rate_limited = 0
+        self.connections = 0
+        self._requests = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        # Обработчики открытых соединений и их потоки записи
+        self._handlers = {}
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+
+        def run():
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            # Клиенты держат keep-alive соединения открытыми: соединения закрываются, и обработчики
+            # выходят по концу потока. Отмена задач вывела бы CancelledError в лог цикла событий
+            for writer in self._handlers.values():
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if headers.get("content-type", "").startswith("application/json"):
+                    params = json.loads(body or b"{}")
+                else:
+                    params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+                path = request_line.split()[1].decode()
+                status, payload = await self._handle(path.rsplit("/", 1)[-1], params)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _handle(self, method, params):
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}}
+        if method != "sendMessage":
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._requests += 1
+        if self.rate_limit_every and self._requests % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        received_at = time.time()
+        self.received.append((params.get("chat_id"), received_at))
+        return 200, {
+            "ok": True,
+            "result": {
+                "message_id": len(self.received),
+                "date": int(received_at),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", ""),
+            },
+        }
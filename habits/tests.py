@@ -1,10 +1,43 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import socket
+import time
+import zoneinfo
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+
+import telegram
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
-from .models import Habit
-from .serializers import HabitSerializer
+from .dispatch import ReminderDispatcher, ReminderMessage, TokenBucket
+from .importer import HabitImporter
+from .models import Habit, Profile, ReminderDelivery, advance_due_at
+from .renderers import ORJSONRenderer
+from .serializers import HabitSerializer, habit_values_serializer
+from .tasks import (
+    collect_reminder_results,
+    retry_reminder_deliveries,
+    send_habit_reminders,
+    send_reminder_shard,
+    zones_with_offset_change,
+)
+from .outbox import build_messages, claim_deliveries, record_results
+from .paginators import HabitCursorPagination
+from .telegram_client import close_client
+from .telegram_stub import StubBotAPIServer
 
 
 
@@ -41,6 +74,85 @@ class HabitModelTest(TestCase):
         self.assertEqual(habit.time, "08:00:00")
         self.assertEqual(habit.action, "Exercise")
 
+    def test_next_due_at_synced_on_save_with_update_fields(self):
+        habit = Habit.objects.create(
+            user=self.user,
+            place="Home",
+            time="08:30:45",
+            action="Exercise",
+            periodicity=1,
+            execution_time=60
+        )
+        # Срок хранится в UTC: 08:30 по Москве — это 05:30 UTC
+        due_at = habit.next_due_at.astimezone(dt_timezone.utc)
+        self.assertEqual((due_at.hour, due_at.minute), (5, 30))
+
+        habit.time = "21:05:00"
+        habit.save(update_fields=["time"])
+        habit.refresh_from_db()
+        due_at = habit.next_due_at.astimezone(dt_timezone.utc)
+        self.assertEqual((due_at.hour, due_at.minute), (18, 5))
+
+    def test_next_due_at_follows_schedule_changes_only(self):
+        habit = Habit.objects.create(
+            user=self.user, place="Home", time="08:30:00", action="Exercise", periodicity=3, execution_time=60
+        )
+        local_due_at = timezone.localtime(habit.next_due_at)
+        self.assertEqual((local_due_at.hour, local_due_at.minute), (8, 30))
+        self.assertGreaterEqual(habit.next_due_at, timezone.now().replace(second=0, microsecond=0))
+
+        habit = Habit.objects.get(pk=habit.pk)
+        advanced = habit.next_due_at + timedelta(days=3)
+        Habit.objects.filter(pk=habit.pk).update(next_due_at=advanced)
+        habit = Habit.objects.get(pk=habit.pk)
+        habit.action = "Stretch"
+        habit.save()
+        self.assertEqual(habit.next_due_at, advanced)
+
+        habit.time = "21:00:00"
+        habit.save()
+        self.assertEqual(timezone.localtime(habit.next_due_at).hour, 21)
+        self.assertLess(habit.next_due_at, advanced)
+
+    def test_advance_due_at_skips_missed_periods(self):
+        tz = zoneinfo.ZoneInfo("Europe/Moscow")
+        due_at = timezone.make_aware(datetime(2025, 1, 1, 8, 30), tz)
+        now = timezone.make_aware(datetime(2025, 1, 10, 12, 0), tz)
+        self.assertEqual(advance_due_at(due_at, 3, tz, now), timezone.make_aware(datetime(2025, 1, 13, 8, 30), tz))
+        self.assertEqual(advance_due_at(due_at, 1, tz, due_at), timezone.make_aware(datetime(2025, 1, 2, 8, 30), tz))
+
+    def test_advance_due_at_keeps_local_time_across_dst(self):
+        tz = zoneinfo.ZoneInfo("Europe/Berlin")
+        due_at = timezone.make_aware(datetime(2025, 3, 29, 8, 30), tz)
+
+        next_due_at = advance_due_at(due_at, 1, tz, due_at)
+
+        self.assertEqual(next_due_at.astimezone(tz).hour, 8)
+        self.assertEqual(
+            next_due_at.astimezone(dt_timezone.utc) - due_at.astimezone(dt_timezone.utc), timedelta(hours=23)
+        )
+
+    def test_timezone_change_reschedules_user_habits(self):
+        profile = Profile.objects.create(user=self.user)
+        habit = Habit.objects.create(
+            user=self.user, place="Home", time="08:30:00", action="Exercise", periodicity=1, execution_time=60
+        )
+        self.assertEqual(timezone.localtime(habit.next_due_at, zoneinfo.ZoneInfo("Europe/Moscow")).hour, 8)
+
+        profile = Profile.objects.get(pk=profile.pk)
+        profile.timezone = "Asia/Vladivostok"
+        profile.save()
+
+        habit.refresh_from_db()
+        self.assertEqual(timezone.localtime(habit.next_due_at, zoneinfo.ZoneInfo("Asia/Vladivostok")).hour, 8)
+        due_at = habit.next_due_at.astimezone(dt_timezone.utc)
+        self.assertEqual((due_at.hour, due_at.minute), (22, 30))
+
+    def test_unknown_timezone_is_rejected(self):
+        profile = Profile(user=self.user, timezone="Mars/Olympus")
+        with self.assertRaises(ValidationError):
+            profile.full_clean()
+
     def test_invalid_related_habit_and_reward(self):
         habit = Habit(
             user=self.user,
@@ -159,6 +271,28 @@ class HabitSerializerTest(APITestCase):
         self.assertFalse(serializer.is_valid())
         self.assertIn("non_field_errors", serializer.errors)
 
+    def test_values_serializer_output_matches_model_serializer(self):
+        pleasant = Habit.objects.create(
+            user=self.user, place="Дом", time="08:00:00", action="Чай", is_pleasant=True, execution_time=60
+        )
+        Habit.objects.create(
+            user=self.user,
+            place="Park",
+            time="07:30:15",
+            action="Run \u2028 \"fast\"",
+            related_habit=pleasant,
+            is_public=True,
+            execution_time=120,
+            periodicity=3,
+        )
+        Habit.objects.create(user=self.user, place="Gym", time="19:00", action="Lift", reward="Кино", execution_time=90)
+        queryset = Habit.objects.all()
+
+        expected = JSONRenderer().render(HabitSerializer(queryset, many=True).data)
+        rows = habit_values_serializer.values(queryset)
+        self.assertEqual(ORJSONRenderer().render(habit_values_serializer.to_representation(rows)), expected)
+        self.assertEqual(JSONRenderer().render(habit_values_serializer.to_representation(rows)), expected)
+
 
 class HabitViewSetTest(APITestCase):
 
@@ -250,6 +384,24 @@ class HabitViewSetTest(APITestCase):
         })
         self.assertEqual(response.status_code, 201)  # Полезная привычка может иметь вознаграждение
 
+    def test_schedule_fields_are_not_exposed(self):
+        response = self.client.post('/api/habits/', {
+            'user': self.user.id,
+            'action': 'Run',
+            'place': 'Park',
+            'time': '07:00:00',
+            'execution_time': 60,
+            'next_due_at': '2000-01-01T00:00:00Z',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('next_due_at', response.data)
+        self.assertNotIn('time_bucket', response.data)
+        self.assertGreater(Habit.objects.get(pk=response.data['id']).next_due_at, timezone.now())
+
+        habit = self.client.get('/api/habits/').data['results'][0]
+        self.assertNotIn('next_due_at', habit)
+        self.assertEqual(set(habit), set(habit_values_serializer.field_names))
+
     def test_create_useful_habit_with_related_habit(self):
         # Создаем связанную привычку
         related_habit = Habit.objects.create(
@@ -272,6 +424,856 @@ class HabitViewSetTest(APITestCase):
         })
         self.assertEqual(response.status_code, 201)  # Ожидаем успешный ответ
 
+    def test_list_paginates_by_cursor_without_count(self):
+        habits = [
+            Habit.objects.create(
+                user=self.user, action=f"Habit {i}", place="Home", time="08:00:00", execution_time=60, periodicity=1
+            )
+            for i in range(7)
+        ]
+        url, seen = "/api/habits/?page_size=3", []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+            seen.extend(habit["id"] for habit in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, [habit.id for habit in reversed(habits)])
+
+    def test_list_pages_through_equal_created_at_without_offset(self):
+        habits = Habit.objects.bulk_create(
+            [
+                Habit(user=self.user, action=f"Habit {i}", place="Home", time="08:00:00", execution_time=60)
+                for i in range(30)
+            ]
+        )
+        Habit.objects.update(created_at=timezone.now())
+        expected = sorted((habit.id for habit in habits), reverse=True)
+
+        def walk(url, link):
+            pages = []
+            while url:
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+                pages.append([habit["id"] for habit in response.data["results"]])
+                last = url
+                url = response.data[link]
+            return pages, last
+
+        pages, last = walk("/api/habits/?page_size=7", "next")
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 7, 2])
+
+        # Назад по ссылкам previous — те же страницы в обратном порядке
+        back, _ = walk(self.client.get(last).data["previous"], "previous")
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_public_feed_is_cached_until_public_habit_changes(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            habit = Habit.objects.create(
+                user=self.user, action="Public", place="Park", time="08:00:00", execution_time=60, is_public=True
+            )
+            Habit.objects.create(user=self.user, action="Hidden", place="Home", time="08:00:00", execution_time=60)
+        self.client.logout()
+
+        response = self.client.get("/api/habits/public/")
+        self.assertEqual([h["action"] for h in response.data["results"]], ["Public"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/habits/public/").data, response.data)
+
+        # Снятие флага публичности сбрасывает кеш ленты
+        with self.captureOnCommitCallbacks(execute=True):
+            habit.is_public = False
+            habit.save()
+        self.assertEqual(self.client.get("/api/habits/public/").data["results"], [])
+
+    def test_public_feed_cache_key_ignores_unrelated_params_and_host(self):
+        cache.clear()
+        for action in ("First", "Second"):
+            Habit.objects.create(
+                user=self.user, action=action, place="Park", time="08:00:00", execution_time=60, is_public=True
+            )
+        self.client.logout()
+
+        response = self.client.get("/api/habits/public/?page_size=1")
+        self.assertEqual([h["action"] for h in response.data["results"]], ["Second"])
+        self.assertTrue(response.data["next"].startswith("http://testserver/api/habits/public/"))
+
+        # Та же страница из кеша, но ссылки строятся по адресу своего запроса
+        with self.assertNumQueries(0):
+            other = self.client.get("/api/habits/public/?utm_source=x&page_size=1", HTTP_HOST="mirror.example.com")
+        self.assertEqual(other.data["results"], response.data["results"])
+        self.assertTrue(other.data["next"].startswith("http://mirror.example.com/api/habits/public/"))
+        self.assertEqual(
+            [h["action"] for h in self.client.get(other.data["next"]).data["results"]], ["First"]
+        )
+        self.assertEqual(self.client.get("/api/habits/public/?cursor=junk").status_code, 404)
+
+    def test_private_habits_are_own_non_public(self):
+        other = User.objects.create_user(email="other@example.com", password="password")
+        for user, is_public in ((self.user, False), (self.user, True), (other, False)):
+            Habit.objects.create(
+                user=user,
+                action=f"{user.email} {is_public}",
+                place="Home",
+                time="08:00:00",
+                execution_time=60,
+                is_public=is_public,
+            )
+        response = self.client.get("/api/habits/private/")
+        self.assertEqual([h["action"] for h in response.data["results"]], ["testuser@example.com False"])
+
+    def test_list_answers_not_modified_until_habit_changes(self):
+        habit = Habit.objects.create(user=self.user, action="Read", place="Home", time="08:00:00", execution_time=60)
+        response = self.client.get("/api/habits/")
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/habits/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any("habits_habit" in query["sql"] for query in queries))
+
+        # Другой курсор — другой ответ и другой ETag
+        self.assertNotEqual(self.client.get("/api/habits/?page_size=1")["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/habits/{habit.id}/", {"place": "Park"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/api/habits/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_version_expires_without_invalidation(self):
+        Habit.objects.create(user=self.user, action="Read", place="Home", time="08:00:00", execution_time=60)
+        etag = self.client.get("/api/habits/")["ETag"]
+
+        # Сброс версии мог не дойти до этого кеша; после CACHE_VERSION_TIMEOUT ответ всё равно строится заново
+        later = time.time() + settings.CACHE_VERSION_TIMEOUT + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            response = self.client.get("/api/habits/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def bulk_items(self, count, **extra):
+        return [
+            {"action": f"Habit {i}", "place": "Home", "time": "08:00:00", "execution_time": 60, **extra}
+            for i in range(count)
+        ]
+
+    def test_bulk_create_uses_constant_number_of_queries(self):
+        pleasant = Habit.objects.create(
+            user=self.user, action="Tea", place="Home", time="08:00:00", execution_time=60, is_pleasant=True
+        )
+        counts = []
+        for count in (3, 30):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    "/api/habits/bulk/", self.bulk_items(count, related_habit=pleasant.id), format="json"
+                )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data), count)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        created = Habit.objects.filter(related_habit=pleasant)
+        self.assertEqual(created.count(), 33)
+        self.assertFalse(created.filter(next_due_at__isnull=True).exists())
+
+    def test_bulk_create_reports_errors_per_item_and_saves_nothing(self):
+        items = self.bulk_items(3)
+        items[1]["related_habit"] = 999999
+        items[2]["execution_time"] = "много"
+
+        response = self.client.post("/api/habits/bulk/", items, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["errors"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("related_habit", errors[1])
+        self.assertIn("execution_time", errors[2])
+        self.assertFalse(Habit.objects.exists())
+
+    def test_bulk_update_and_delete(self):
+        habits = [
+            Habit.objects.create(user=self.user, action=f"Habit {i}", place="Home", time="08:00:00", execution_time=60)
+            for i in range(3)
+        ]
+        other = User.objects.create_user(email="other@example.com", password="password")
+        foreign = Habit.objects.create(user=other, action="Foreign", place="Home", time="08:00:00", execution_time=60)
+
+        response = self.client.patch(
+            "/api/habits/bulk/", [{"id": foreign.id, "place": "Park"}, {"id": habits[0].id}], format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{"id": ["Привычка не найдена."]}, {}])
+
+        response = self.client.patch(
+            "/api/habits/bulk/",
+            [{"id": habits[0].id, "place": "Park"}, {"id": habits[1].id, "time": "21:15:00"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        habits[0].refresh_from_db()
+        self.assertEqual(habits[0].place, "Park")
+        rescheduled = Habit.objects.get(pk=habits[1].pk)
+        self.assertEqual(timezone.localtime(rescheduled.next_due_at).time().isoformat(), "21:15:00")
+
+        response = self.client.delete("/api/habits/bulk/", {"ids": [habits[0].id, foreign.id]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Habit.objects.count(), 4)
+
+        response = self.client.delete("/api/habits/bulk/", {"ids": [habits[0].id, habits[2].id]}, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Habit.objects.filter(user=self.user).values_list("id", flat=True)), [habits[1].id])
+
+    def test_related_graph_in_one_query_with_cycle_protection(self):
+        def create(action, **extra):
+            return Habit.objects.create(
+                user=self.user, action=action, place="Home", time="08:00:00", execution_time=60, **extra
+            )
+
+        tea = create("Tea", is_pleasant=True)
+        read, run = create("Read", related_habit=tea), create("Run", related_habit=tea)
+        alone = create("Alone")
+        first, second = create("First"), create("Second")
+        # Цикл невозможен через API, но обход не должен на нём зацикливаться
+        Habit.objects.filter(pk=first.pk).update(related_habit=second)
+        Habit.objects.filter(pk=second.pk).update(related_habit=first)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/habits/{read.id}/graph/")
+        self.assertEqual(sum("habits_habit" in query["sql"] for query in queries), 1)
+        self.assertEqual(
+            [(node["id"], node["depth"]) for node in response.data["nodes"]], [(read.id, 0), (tea.id, 1), (run.id, 2)]
+        )
+        self.assertCountEqual(
+            response.data["edges"],
+            [{"habit": read.id, "related_habit": tea.id}, {"habit": run.id, "related_habit": tea.id}],
+        )
+
+        response = self.client.get(f"/api/habits/{read.id}/graph/?depth=1")
+        self.assertEqual([node["id"] for node in response.data["nodes"]], [read.id, tea.id])
+
+        response = self.client.get(f"/api/habits/{first.id}/graph/")
+        self.assertEqual(
+            [(node["id"], node["depth"]) for node in response.data["nodes"]], [(first.id, 0), (second.id, 1)]
+        )
+
+        response = self.client.get("/api/habits/graph/")
+        depths = {node["id"]: node["depth"] for node in response.data["nodes"]}
+        self.assertEqual(depths, {tea.id: 0, alone.id: 0, read.id: 1, run.id: 1, first.id: None, second.id: None})
+
+        other = User.objects.create_user(email="other@example.com", password="password")
+        foreign = Habit.objects.create(user=other, action="Foreign", place="Home", time="08:00:00", execution_time=60)
+        self.assertEqual(self.client.get(f"/api/habits/{foreign.id}/graph/").status_code, 404)
+
+    def test_export_streams_ndjson_and_csv_in_chunks(self):
+        for i in range(7):
+            Habit.objects.create(user=self.user, action=f"Дело {i}", place="Home", time="08:00:00", execution_time=60)
+        other = User.objects.create_user(email="other@example.com", password="password")
+        Habit.objects.create(user=other, action="Foreign", place="Home", time="08:00:00", execution_time=60)
+        habits = Habit.objects.filter(user=self.user)
+        expected = json.loads(JSONRenderer().render(HabitSerializer(habits, many=True).data))
+
+        with override_settings(HABIT_EXPORT_CHUNK_SIZE=3):
+            response = self.client.get("/api/habits/export/")
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual([json.loads(line) for line in b"".join(chunks).splitlines()], expected)
+
+        response = self.client.get("/api/habits/export/?fmt=csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["action"] for row in rows], [habit["action"] for habit in expected])
+        self.assertEqual(rows[0]["reward"], "")
+
+        self.assertEqual(self.client.get("/api/habits/export/?fmt=xml").status_code, 400)
+
+    def test_sparse_fields_narrow_payload_and_select(self):
+        for i in range(3):
+            Habit.objects.create(
+                user=self.user, action=f"Дело {i}", place="Home", time="08:00:00", execution_time=60, reward="Торт"
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/habits/?fields=id,action&page_size=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([list(habit) for habit in response.data["results"]], [["id", "action"]] * 2)
+        select = next(query["sql"] for query in queries.captured_queries if 'FROM "habits_habit"' in query["sql"])
+        self.assertNotIn('"reward"', select)
+        next_page = self.client.get(response.data["next"])
+        self.assertEqual([list(habit) for habit in next_page.data["results"]], [["id", "action"]])
+
+        habit = Habit.objects.filter(user=self.user).first()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/habits/{habit.id}/?fields=action,time")
+        self.assertEqual(response.data, {"action": habit.action, "time": "08:00:00"})
+        select = next(query["sql"] for query in queries.captured_queries if 'FROM "habits_habit"' in query["sql"])
+        self.assertNotIn('"reward"', select)
+
+        response = self.client.get("/api/habits/?fields=id,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.data)
+
+    def test_import_ndjson_in_batches_reports_row_errors(self):
+        pleasant = Habit.objects.create(
+            user=self.user, action="Чай", place="Home", time="08:00:00", execution_time=60, is_pleasant=True
+        )
+        lines = [
+            {"action": "Зарядка", "place": "Home", "time": "07:00:00", "execution_time": 60},
+            {"action": "Прогулка", "place": "Park", "time": "19:00", "execution_time": 90, "is_public": True},
+            "не json",
+            {"action": "Долго", "place": "Home", "time": "08:00:00", "execution_time": 600},
+            {"action": "Чтение", "place": "Home", "time": "21:00:00", "execution_time": 60,
+             "related_habit": pleasant.id},
+            {"action": "Оба", "place": "Home", "time": "21:00:00", "execution_time": 60,
+             "related_habit": pleasant.id, "reward": "Торт"},
+            {"place": "Home", "time": "08:00:00", "execution_time": 60},
+        ]
+        body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+
+        with override_settings(HABIT_IMPORT_BATCH_SIZE=2), mock.patch.object(
+            HabitImporter, "write", autospec=True, side_effect=HabitImporter.write
+        ) as write:
+            response = self.client.post("/api/habits/import/", body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["imported"], response.data["failed"]), (3, 4))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4, 6, 7])
+        self.assertIn("execution_time", response.data["errors"][1]["errors"])
+        self.assertIn("action", response.data["errors"][3]["errors"])
+        # Одна запись на порцию, а не на строку
+        self.assertEqual([len(call.args[1]) for call in write.call_args_list], [2, 0, 1, 0])
+        reading = Habit.objects.get(action="Чтение")
+        self.assertEqual(reading.related_habit, pleasant)
+        self.assertIsNotNone(reading.next_due_at)
+        self.assertTrue(Habit.objects.get(action="Прогулка").is_public)
+
+    def test_import_reports_mistyped_values_as_row_errors(self):
+        lines = [
+            {"action": "Зарядка", "place": "Home", "time": 123, "execution_time": 60},
+            {"action": ["Прогулка"], "place": "Park", "time": "19:00", "execution_time": 90},
+            {"action": "Чтение", "place": "Home", "time": {"h": 21}, "execution_time": 60},
+            {"action": "Сон", "place": "Home", "time": "23:00:00", "execution_time": 60},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines)
+
+        response = self.client.post("/api/habits/import/", body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["imported"], response.data["failed"]), (1, 3))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [1, 2, 3])
+        self.assertIn("time", response.data["errors"][0]["errors"])
+        self.assertIn("action", response.data["errors"][1]["errors"])
+        self.assertTrue(Habit.objects.filter(user=self.user, action="Сон").exists())
+
+    def test_import_failure_still_invalidates_written_batches(self):
+        lines = [
+            {"action": f"Дело {i}", "place": "Home", "time": "08:00:00", "execution_time": 60, "is_public": True}
+            for i in range(4)
+        ]
+        importer = HabitImporter(self.user, batch_size=2)
+        calls = []
+
+        def write(habits):
+            if calls:
+                raise DatabaseError("connection lost")
+            calls.append(len(habits))
+            HabitImporter.write(importer, habits)
+
+        with mock.patch.object(importer, "write", side_effect=write), mock.patch(
+            "habits.importer.invalidate_user_habits"
+        ) as invalidate_user, mock.patch("habits.importer.invalidate_public_feed") as invalidate_feed:
+            with self.assertRaises(DatabaseError):
+                importer.run([json.dumps(line) for line in lines], "ndjson")
+
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 2)
+        invalidate_user.assert_called_once_with([self.user.pk])
+        invalidate_feed.assert_called_once_with()
+
+    def test_imported_batch_pages_in_file_order(self):
+        lines = [
+            json.dumps({"action": f"Дело {i}", "place": "Home", "time": "08:00:00", "execution_time": 60})
+            for i in range(12)
+        ]
+        # На PostgreSQL порция идёт через COPY с одним created_at на все строки
+        HabitImporter(self.user, batch_size=12).run(lines, "ndjson")
+
+        actions, url = [], "/api/habits/?page_size=5"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+            actions += [habit["action"] for habit in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(actions, [f"Дело {i}" for i in reversed(range(12))])
+
+    def test_import_csv_accepts_export(self):
+        for i in range(3):
+            Habit.objects.create(user=self.user, action=f"Дело {i}", place="Home", time="08:00:00", execution_time=60)
+        exported = b"".join(self.client.get("/api/habits/export/?fmt=csv").streaming_content)
+
+        response = self.client.post("/api/habits/import/?fmt=csv", exported, content_type="text/csv")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {"imported": 3, "failed": 0, "errors": []})
+        self.assertEqual(Habit.objects.filter(user=self.user, action="Дело 0").count(), 2)
+        self.assertEqual(self.client.post("/api/habits/import/?fmt=xml", b"", content_type="text/csv").status_code, 400)
+
+
+class AsyncHabitViewsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="async@example.com", password="password")
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        for i in range(3):
+            Habit.objects.create(
+                user=self.user, action=f"Дело {i}", place="Home", time="08:00:00", execution_time=60, is_public=i == 0
+            )
+        other = User.objects.create_user(email="other@example.com", password="password")
+        Habit.objects.create(user=other, action="Foreign", place="Home", time="08:00:00", execution_time=60)
+
+    async def test_list_matches_sync_endpoint(self):
+        sync_page = await sync_to_async(self.client.get)("/api/habits/?page_size=2", headers=self.headers)
+        response = await self.async_client.get("/api/async/habits/?page_size=2", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], sync_page.json()["results"])
+        self.assertIn("/api/async/habits/", response.json()["next"])
+
+        next_page = await self.async_client.get(response.json()["next"], headers=self.headers)
+        self.assertEqual([habit["action"] for habit in next_page.json()["results"]], ["Дело 0"])
+
+        response = await self.async_client.get("/api/async/habits/?fields=id,action", headers=self.headers)
+        self.assertEqual({tuple(habit) for habit in response.json()["results"]}, {("id", "action")})
+        self.assertEqual((await self.async_client.get("/api/async/habits/")).status_code, 401)
+        self.assertEqual((await self.async_client.get("/api/async/habits/?fields=x", headers=self.headers)).status_code, 400)
+
+    async def test_list_pages_through_equal_created_at(self):
+        await Habit.objects.aupdate(created_at=timezone.now())
+        expected = [pk async for pk in Habit.objects.filter(user=self.user).order_by("-id").values_list("id", flat=True)]
+
+        pages, url = [], "/api/async/habits/?page_size=2"
+        while url:
+            response = await self.async_client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            pages.append([habit["id"] for habit in response.json()["results"]])
+            last, url = url, response.json()["next"]
+        self.assertEqual(pages, [expected[:2], expected[2:]])
+
+        previous = (await self.async_client.get(last, headers=self.headers)).json()["previous"]
+        response = await self.async_client.get(previous, headers=self.headers)
+        self.assertEqual([habit["id"] for habit in response.json()["results"]], expected[:2])
+
+    async def test_detail_and_etag(self):
+        habit = await Habit.objects.filter(user=self.user).afirst()
+        sync_detail = await sync_to_async(self.client.get)(f"/api/habits/{habit.pk}/", headers=self.headers)
+        response = await self.async_client.get(f"/api/async/habits/{habit.pk}/", headers=self.headers)
+        self.assertEqual(response.content, sync_detail.content)
+
+        cached = await self.async_client.get(
+            f"/api/async/habits/{habit.pk}/", headers={**self.headers, "If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(cached.status_code, 304)
+        foreign = await Habit.objects.exclude(user=self.user).afirst()
+        response = await self.async_client.get(f"/api/async/habits/{foreign.pk}/", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_public_feed_is_anonymous(self):
+        response = await self.async_client.get("/api/async/habits/public/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([habit["action"] for habit in response.json()["results"]], ["Дело 0"])
+        self.assertEqual((await self.async_client.post("/api/async/habits/public/")).status_code, 405)
+
+
+class FakeBot:
+    """Бот-заглушка: первые rate_limited отправок отвечают 429."""
+
+    def __init__(self, rate_limited=0):
+        self.rate_limited = rate_limited
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise telegram.error.RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+class ReminderDispatcherTest(SimpleTestCase):
+
+    def test_token_bucket_waits_when_empty(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, clock=lambda: now[0])
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+
+        bucket.pause(3)
+        self.assertGreaterEqual(bucket.reserve(), 3)
+
+    def test_send_all_delivers_every_message(self):
+        bot = FakeBot()
+        messages = [ReminderMessage(i, str(i), f"Напоминание {i}") for i in range(50)]
+        dispatcher = ReminderDispatcher(bot, concurrency=4, global_rate=1000, chat_rate=1000)
+
+        results = asyncio.run(dispatcher.send_all(messages))
+
+        self.assertEqual(sorted(result.key for result in results if result.ok), list(range(50)))
+        self.assertEqual(len(bot.sent), 50)
+
+    def test_retry_after_is_retried(self):
+        bot = FakeBot(rate_limited=2)
+        dispatcher = ReminderDispatcher(bot, global_rate=1000, chat_rate=1000, max_retries=3)
+
+        result = asyncio.run(dispatcher.send(ReminderMessage(1, "100", "Напоминание")))
+
+        self.assertTrue(result.ok)
+        self.assertEqual(bot.sent, [("100", "Напоминание")])
+
+    def test_retry_after_gives_up_after_max_retries(self):
+        bot = FakeBot(rate_limited=5)
+        dispatcher = ReminderDispatcher(bot, global_rate=1000, chat_rate=1000, max_retries=1)
+
+        result = asyncio.run(dispatcher.send(ReminderMessage(1, "100", "Напоминание")))
+
+        self.assertFalse(result.ok)
+        self.assertEqual(bot.sent, [])
+
+
+class StubBotAPIServerTest(SimpleTestCase):
+
+    def test_stop_closes_keep_alive_connections_quietly(self):
+        errors = []
+        stub = StubBotAPIServer().start()
+        stub._loop.set_exception_handler(lambda loop, context: errors.append(context))
+        body = json.dumps({"chat_id": "1", "text": "x"}).encode()
+        with socket.create_connection((stub.host, stub.port)) as client:
+            client.sendall(
+                b"POST /bottest/sendMessage HTTP/1.1\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n" % len(body) + body
+            )
+            self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200"))
+            # Соединение осталось открытым, как keep-alive соединение клиента Bot API
+            stub.stop()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(stub.received[0][0], "1")
+
+
+class SendHabitRemindersTest(TestCase):
+
+    def setUp(self):
+        self.now = timezone.make_aware(datetime(2025, 1, 6, 8, 30, 12))
+        self.user = User.objects.create_user(email="testuser@example.com", password="password")
+        Profile.objects.create(user=self.user, telegram_chat_id="100")
+        self.user_without_chat = User.objects.create_user(email="nochat@example.com", password="password")
+        Profile.objects.create(user=self.user_without_chat)
+        for user in (self.user, self.user_without_chat):
+            Habit.objects.create(
+                user=user, action="Read", place="Home", time="08:30:00", execution_time=60, periodicity=1
+            )
+        Habit.objects.create(
+            user=self.user, action="Run", place="Park", time="09:00:00", execution_time=60, periodicity=1
+        )
+        Habit.objects.filter(time="08:30:00").update(next_due_at=self.scheduled_for)
+        Habit.objects.filter(time="09:00:00").update(next_due_at=self.scheduled_for + timedelta(minutes=30))
+        self.addCleanup(close_client)
+
+    def test_recipients_fetched_in_one_query(self):
+        with self.assertNumQueries(1):
+            recipients = list(Habit.objects.reminder_recipients())
+        self.assertEqual({r.user__profile__telegram_chat_id for r in recipients}, {"100"})
+
+    def test_shards_partition_due_habits(self):
+        due = Habit.objects.filter(next_due_at__lte=self.now)
+        shards = [set(due.for_shard(shard, 3).values_list("id", flat=True)) for shard in range(3)]
+
+        self.assertEqual(set().union(*shards), set(due.values_list("id", flat=True)))
+        self.assertEqual(sum(len(shard) for shard in shards), due.count())
+
+    def run_shard(self, stub, **settings):
+        with override_settings(TELEGRAM_BOT_TOKEN="test", TELEGRAM_BASE_URL=stub.base_url, **settings):
+            return send_reminder_shard.apply(args=(self.now.isoformat(), 0, 1)).get()
+
+    @property
+    def scheduled_for(self):
+        return self.now.replace(second=0)
+
+    def test_shard_sends_reminders_and_reports_counts(self):
+        user_without_profile = User.objects.create_user(email="noprofile@example.com", password="password")
+        Profile.objects.filter(user=user_without_profile).delete()
+        habit_without_profile = Habit.objects.create(
+            user=user_without_profile, action="Read", place="Home", time="08:30:00", execution_time=60, periodicity=1
+        )
+        Habit.objects.filter(pk=habit_without_profile.pk).update(next_due_at=self.scheduled_for)
+        with StubBotAPIServer() as stub:
+            result = self.run_shard(stub)
+
+        self.assertEqual([chat_id for chat_id, _ in stub.received], ["100"])
+        self.assertEqual(result, {"shard": 0, "sent": 1, "failed": 0})
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_SENT)
+        self.assertEqual(delivery.idempotency_key, f"{delivery.habit_id}:202501060530")
+
+        # Сроки наступивших привычек перенесены на будущее, в том числе тех, кому некуда отправить
+        # напоминание: иначе они навсегда остались бы в выборке next_due_at <= now
+        for habit in (delivery.habit, Habit.objects.get(user=self.user_without_chat), habit_without_profile):
+            habit.refresh_from_db()
+            self.assertGreater(habit.next_due_at, timezone.now())
+        self.assertEqual(ReminderDelivery.objects.filter(habit=habit_without_profile).count(), 0)
+        # Привычку, срок которой не наступил, рассылка не трогает
+        self.assertEqual(
+            Habit.objects.get(action="Run").next_due_at, self.scheduled_for + timedelta(minutes=30)
+        )
+
+    def test_bot_client_is_reused_between_runs(self):
+        with StubBotAPIServer() as stub:
+            self.run_shard(stub)
+            other = User.objects.create_user(email="other@example.com", password="password")
+            Profile.objects.create(user=other, telegram_chat_id="200")
+            habit = Habit.objects.create(
+                user=other, action="Read", place="Home", time="08:30:00", execution_time=60, periodicity=1
+            )
+            Habit.objects.filter(pk=habit.pk).update(next_due_at=self.scheduled_for)
+            self.run_shard(stub)
+
+        self.assertEqual([chat_id for chat_id, _ in stub.received], ["100", "200"])
+        # Обе рассылки прошли по одному соединению из пула клиента процесса
+        self.assertEqual(stub.connections, 1)
+
+    def test_rerun_does_not_resend_delivered_reminders(self):
+        with StubBotAPIServer() as stub:
+            self.run_shard(stub)
+            result = self.run_shard(stub)
+
+        self.assertEqual(len(stub.received), 1)
+        self.assertEqual(result["sent"], 0)
+        self.assertEqual(ReminderDelivery.objects.count(), 1)
+
+    def test_results_are_recorded_before_the_claim_lease_expires(self):
+        for i in range(5):
+            user = User.objects.create_user(email=f"chat{i}@example.com", password="password")
+            Profile.objects.create(user=user, telegram_chat_id=str(200 + i))
+            habit = Habit.objects.create(
+                user=user, action="Read", place="Home", time="08:30:00", execution_time=60, periodicity=1
+            )
+            Habit.objects.filter(pk=habit.pk).update(next_due_at=self.scheduled_for)
+        leases, late = {}, []
+
+        def claim(queryset, now, limit):
+            deliveries = claim_deliveries(queryset, now, limit)
+            leases.update((delivery.pk, now + timedelta(seconds=1)) for delivery in deliveries)
+            return deliveries
+
+        def record(deliveries, results, now):
+            late.extend(delivery.pk for delivery in deliveries if now >= leases[delivery.pk])
+            return record_results(deliveries, results, now)
+
+        # 2 сообщения/с на шард при аренде в 1 с: шесть строк одной порцией шли бы дольше аренды,
+        # и повтор забрал бы их, пока результат ещё не записан
+        with StubBotAPIServer() as stub, mock.patch("habits.tasks.claim_deliveries", side_effect=claim), mock.patch(
+            "habits.tasks.record_results", side_effect=record
+        ):
+            result = self.run_shard(stub, REMINDER_CLAIM_LEASE=1, TELEGRAM_GLOBAL_RATE=4, REMINDER_SHARDS=1)
+
+        self.assertEqual(result["sent"], 6)
+        self.assertEqual(late, [])
+        self.assertEqual(len(stub.received), 6)
+
+    def test_delivery_status_and_due_date_are_written_together(self):
+        habit = Habit.objects.get(user=self.user, action="Read")
+        with StubBotAPIServer() as stub, mock.patch(
+            "habits.outbox.advance_habits", side_effect=DatabaseError("connection lost")
+        ), self.assertRaises(DatabaseError):
+            self.run_shard(stub)
+
+        # Строка не отмечена отправленной, срок не сдвинут: повтор после аренды доставит и перенесёт его
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(Habit.objects.get(pk=habit.pk).next_due_at, self.scheduled_for)
+
+        ReminderDelivery.objects.update(next_attempt_at=timezone.now())
+        with StubBotAPIServer() as stub, override_settings(
+            TELEGRAM_BOT_TOKEN="test", TELEGRAM_BASE_URL=stub.base_url
+        ):
+            self.assertEqual(retry_reminder_deliveries(), {"sent": 1, "failed": 0})
+        self.assertGreater(Habit.objects.get(pk=habit.pk).next_due_at, timezone.now())
+
+    def test_failed_delivery_backs_off_and_retries_alone(self):
+        Profile.objects.filter(user=self.user_without_chat).update(telegram_chat_id="200")
+        with StubBotAPIServer(rate_limit_every=2, retry_after=0) as stub:
+            result = self.run_shard(stub, TELEGRAM_MAX_RETRIES=0, TELEGRAM_SEND_CONCURRENCY=1)
+        self.assertEqual((result["sent"], result["failed"]), (1, 1))
+
+        failed = ReminderDelivery.objects.get(status=ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(failed.attempts, 1)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+
+        # Пока пауза не истекла, повторять нечего
+        with StubBotAPIServer() as stub, override_settings(
+            TELEGRAM_BOT_TOKEN="test", TELEGRAM_BASE_URL=stub.base_url
+        ):
+            self.assertEqual(retry_reminder_deliveries(), {"sent": 0, "failed": 0})
+            ReminderDelivery.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(retry_reminder_deliveries(), {"sent": 1, "failed": 0})
+
+        self.assertEqual([chat_id for chat_id, _ in stub.received], [failed.chat_id])
+        self.assertFalse(ReminderDelivery.objects.exclude(status=ReminderDelivery.STATUS_SENT).exists())
+
+    def test_digest_sends_one_message_per_chat(self):
+        Habit.objects.filter(action="Run").update(next_due_at=self.scheduled_for)
+        with StubBotAPIServer() as stub:
+            result = self.run_shard(stub, REMINDER_DIGEST=True)
+
+        self.assertEqual([chat_id for chat_id, _ in stub.received], ["100"])
+        self.assertEqual(result, {"shard": 0, "sent": 2, "failed": 0})
+        self.assertEqual(ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_SENT).count(), 2)
+
+    def test_digest_splits_messages_over_telegram_limit(self):
+        deliveries = [ReminderDelivery(pk=pk, chat_id="100", text="x" * 3000) for pk in (1, 2)]
+        deliveries.append(ReminderDelivery(pk=3, chat_id="200", text="y"))
+
+        messages = build_messages(deliveries, digest=True)
+
+        self.assertEqual([(m.key, m.chat_id) for m in messages], [((1,), "100"), ((2,), "100"), ((3,), "200")])
+
+    def test_coordinator_dispatches_one_task_per_shard(self):
+        with override_settings(REMINDER_SHARDS=4), mock.patch(
+            "habits.tasks.timezone.now", return_value=self.now
+        ), mock.patch("habits.tasks.chord") as chord:
+            send_habit_reminders()
+
+        shard_signatures = list(chord.call_args.args[0])
+        self.assertEqual(
+            [s.args for s in shard_signatures],
+            [(self.now.isoformat(), shard, 4) for shard in range(4)],
+        )
+
+    def test_dst_refresh_detects_zones_changing_offset(self):
+        now = datetime(2025, 3, 30, 12, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(zones_with_offset_change({"Europe/Berlin", "Europe/Moscow"}, now), {"Europe/Berlin"})
+
+    def test_collect_reminder_results_sums_shards(self):
+        summary = collect_reminder_results(
+            [{"shard": 0, "sent": 3, "failed": 1}, {"shard": 1, "sent": 2, "failed": 0}],
+            self.now.isoformat(),
+        )
+        self.assertEqual((summary["sent"], summary["failed"]), (5, 1))
+
+@skipUnless(connection.vendor == "postgresql", "Планы запросов проверяются только на PostgreSQL")
+class QueryPlanTest(TestCase):
+    """Горячие запросы API и задач должны идти по индексам, а не полным сканом больших таблиц."""
+
+    USERS = 200
+    HABITS_PER_USER = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        users = User.objects.bulk_create(
+            [User(email=f"plan{i}@example.com", password="!") for i in range(cls.USERS)]
+        )
+        Profile.objects.bulk_create(
+            [
+                Profile(user=user, telegram_chat_id=str(user.pk), timezone="Europe/Berlin" if i % 50 else "Asia/Tokyo")
+                for i, user in enumerate(users)
+            ]
+        )
+        habits = Habit.objects.bulk_create(
+            [
+                Habit(
+                    user=user,
+                    place="Home",
+                    time="08:00:00",
+                    action=f"Habit {i}",
+                    execution_time=60,
+                    is_public=i % 100 == 0,
+                    next_due_at=now + timedelta(minutes=i),
+                )
+                for user in users
+                for i in range(cls.HABITS_PER_USER)
+            ]
+        )
+        ReminderDelivery.objects.bulk_create(
+            [
+                ReminderDelivery(
+                    habit=habit,
+                    scheduled_for=now,
+                    idempotency_key=ReminderDelivery.make_idempotency_key(habit.pk, now),
+                    chat_id="1",
+                    text="Напоминание",
+                    status=ReminderDelivery.STATUS_PENDING if i % 100 == 0 else ReminderDelivery.STATUS_SENT,
+                    next_attempt_at=now,
+                )
+                for i, habit in enumerate(habits)
+            ]
+        )
+        with connection.cursor() as cursor:
+            for model in (Habit, Profile, ReminderDelivery):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        cls.user = users[0]
+        cls.now = now
+
+    # Засеянные большие таблицы; маленькие справочники планировщик вправе читать целиком
+    LARGE_TABLES = ("habits_habit", "habits_reminderdelivery")
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        for table in self.LARGE_TABLES:
+            self.assertNotIn(f"Seq Scan on {table}", plan, f"Полный скан {table}:\n{queryset.query}\n{plan}")
+        if index is not None:
+            self.assertIn(index, plan, f"Запрос идёт не по {index}:\n{queryset.query}\n{plan}")
+
+    def test_user_habit_list(self):
+        self.assertUsesIndex(Habit.objects.filter(user=self.user).order_by("-created_at", "-id")[:6])
+
+    def test_user_habit_list_next_page(self):
+        paginator = HabitCursorPagination()
+        habits = Habit.objects.filter(user=self.user)
+        paginator.paginate_queryset(habits, Request(APIRequestFactory().get("/", {"page_size": 5})))
+        request = Request(APIRequestFactory().get(paginator.get_next_link()))
+        # Условие (created_at, id) < (...) — граница поиска по индексу, а не фильтр после чтения строк
+        self.assertUsesIndex(paginator.page_queryset(habits, request), "habit_user_created_idx")
+
+    def test_private_habit_list(self):
+        self.assertUsesIndex(
+            Habit.objects.filter(user=self.user, is_public=False).order_by("-created_at", "-id")[:6]
+        )
+
+    def test_public_feed(self):
+        self.assertUsesIndex(Habit.objects.filter(is_public=True).order_by("-created_at", "-id")[:6])
+
+    def test_due_reminders_scan(self):
+        due = Habit.objects.filter(next_due_at__lte=self.now).for_shard(0, 8)
+        # Шард читает только свои слоты, а не все наступившие напоминания
+        self.assertUsesIndex(due.reminder_recipients(), "habit_shard_due_idx")
+
+    def test_unreachable_due_habits_scan(self):
+        due = Habit.objects.filter(next_due_at__lte=self.now).for_shard(0, 8)
+        self.assertUsesIndex(due.without_recipient().order_by().values_list("id", "next_due_at"))
+
+    def test_pending_deliveries_claim(self):
+        self.assertUsesIndex(
+            ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_PENDING, next_attempt_at__lte=self.now)
+        )
+
+    def test_deliveries_of_habits_chunk(self):
+        habit_ids = list(Habit.objects.filter(user=self.user).values_list("id", flat=True))
+        self.assertUsesIndex(ReminderDelivery.objects.filter(habit_id__in=habit_ids))
+
+    def test_dst_refresh_habits(self):
+        self.assertUsesIndex(Habit.objects.filter(user__profile__timezone__in=["Asia/Tokyo"]))
+
 
 def test_create_pleasant_habit_without_related_or_reward(self):
     # Попытка создать приятную привычку без вознаграждения и связанной привычки
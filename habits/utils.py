@@ -0,0 +1,8 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """Разбивает поток на списки не длиннее size."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
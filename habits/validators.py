@@ -1,3 +1,5 @@
+import zoneinfo
+
 from django.core.exceptions import ValidationError
 
 
@@ -33,3 +35,11 @@ def validate_pleasant_habit(reward, related_habit, is_pleasant):
         raise ValidationError(
             "Приятная привычка не может иметь вознаграждение или связанную привычку."
         )
+
+
+def validate_timezone(value):
+    """Проверка, что часовой пояс есть в базе IANA."""
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Неизвестный часовой пояс: {value}.")
@@ -1,39 +1,240 @@
+import codecs
 import logging
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
 from . import serializers
 from .permissions import IsOwnerOrReadOnly
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+from .bulk import BulkError, bulk_create_habits, bulk_delete_habits, bulk_update_habits
+from .cache import get_public_feed_page, user_habits_etag
+from .export import EXPORT_FORMATS
+from .importer import PARSERS, HabitImporter
 from .models import Habit
-from .serializers import HabitSerializer
+from .paginators import HabitCursorPagination
+from .serializers import HabitSerializer, habit_values_serializer
 
 # Инициализируем логгер
 logger = logging.getLogger(__name__)
 
+
+def requested_fields(query_params):
+    """Поля из ?fields=id,action,...; None, если параметр не задан."""
+    fields = [name.strip() for name in query_params.get('fields', '').split(',') if name.strip()]
+    if not fields:
+        return None
+    unknown = [name for name in fields if name not in habit_values_serializer.field_names]
+    if unknown:
+        raise ValidationError({"fields": [f"Неизвестные поля: {', '.join(unknown)}."]})
+    return fields
+
+
+def values_serializer(fields):
+    return habit_values_serializer if fields is None else habit_values_serializer.only(fields)
+
+
+def public_feed_params(request):
+    """Параметры запроса, от которых зависит страница публичной ленты; неверный курсор — 404."""
+    paginator = HabitCursorPagination()
+    cursor = paginator.decode_cursor(request)
+    fields = requested_fields(request.query_params)
+    return (
+        cursor and (cursor.reverse, cursor.position),
+        paginator.get_page_size(request),
+        fields and sorted(fields),
+    )
+
+
+def public_feed_page(request):
+    """Страница публичной ленты для кеша: строки и курсоры соседних страниц."""
+    serializer = values_serializer(requested_fields(request.query_params))
+    paginator = HabitCursorPagination()
+    queryset = serializer.values(Habit.objects.filter(is_public=True), *paginator.cursor_fields)
+    page = paginator.paginate_queryset(queryset, request)
+    return {"results": serializer.to_representation(page), **paginator.get_page_cursors()}
+
+
+def public_feed_response(request, page):
+    """Ответ ленты из страницы кеша: ссылки на соседние страницы строятся по адресу этого запроса."""
+    paginator = HabitCursorPagination()
+    paginator.base_url = request.build_absolute_uri()
+    return {
+        "next": paginator.cursor_link(page["next"]),
+        "previous": paginator.cursor_link(page["previous"]),
+        "results": page["results"],
+    }
+
+
+def get_public_feed(request):
+    """Публичная лента: страницы отдаются из общего кеша до изменения публичных привычек."""
+    page = get_public_feed_page(public_feed_params(request), lambda: public_feed_page(request))
+    return public_feed_response(request, page)
+
+
 class HabitViewSet(viewsets.ModelViewSet):
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
+    pagination_class = HabitCursorPagination
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def public(self, request):
-        public_habits = Habit.objects.filter(is_pleasant=True)  # Пример публичных привычек
-        serializer = HabitSerializer(public_habits, many=True)
-        return Response(serializer.data)
+        """Публичная лента: страницы отдаются из общего кеша до изменения публичных привычек."""
+        return Response(get_public_feed(request))
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def private(self, request):
-        private_habits = Habit.objects.filter(is_pleasant=False)  # Пример приватных привычек
-        serializer = HabitSerializer(private_habits, many=True)
-        return Response(serializer.data)
+        return self.paginated_values(Habit.objects.filter(user=request.user, is_public=False))
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """Массовые операции: POST — создать массив привычек, PATCH — изменить по id, DELETE — удалить по ids.
+
+        Пакет проверяется целиком и пишется в одной транзакции; при ошибках
+        ничего не сохраняется, а в errors по индексу элемента лежат его ошибки.
+        """
+        try:
+            if request.method == 'POST':
+                habits = bulk_create_habits(request.user, request.data)
+                response_status = status.HTTP_201_CREATED
+            elif request.method == 'PATCH':
+                habits = bulk_update_habits(request.user, request.data)
+                response_status = status.HTTP_200_OK
+            else:
+                ids = request.data.get('ids') if isinstance(request.data, dict) else None
+                deleted = bulk_delete_habits(request.user, ids)
+                logger.info(f"Пользователь {request.user.email} удалил привычек: {deleted}")
+                return Response(status=status.HTTP_204_NO_CONTENT)
+        except BulkError as e:
+            return Response({"errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info(f"Пользователь {request.user.email} записал привычек пакетом: {len(habits)}")
+        return Response(HabitSerializer(habits, many=True).data, status=response_status)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def graph(self, request, pk=None):
+        """Граф связанных привычек вокруг одной привычки пользователя."""
+        try:
+            habit_id = int(pk)
+        except ValueError:
+            raise Http404
+        nodes = list(Habit.objects.related_graph(request.user.pk, habit_id, self.graph_depth(request)))
+        if not nodes:
+            raise Http404
+        return Response(self.graph_data(nodes))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='graph')
+    def graph_all(self, request):
+        """Граф связанных привычек пользователя целиком."""
+        nodes = list(Habit.objects.related_graph(request.user.pk, max_depth=self.graph_depth(request)))
+        return Response(self.graph_data(nodes))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """Потоковая выгрузка всех привычек пользователя: ?fmt=ndjson (по умолчанию) или ?fmt=csv.
+
+        Параметр называется fmt, потому что format DRF использует для выбора рендерера.
+        """
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            raise ValidationError({"fmt": [f"Поддерживаются форматы: {', '.join(EXPORT_FORMATS)}."]})
+        stream, content_type, filename = EXPORT_FORMATS[fmt]
+        response = StreamingHttpResponse(
+            stream(self.get_queryset(), settings.HABIT_EXPORT_CHUNK_SIZE), content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        logger.info(f"Пользователь {request.user.email} выгружает привычки в {fmt}")
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], url_path='import')
+    def import_habits(self, request):
+        """Импорт привычек из тела запроса в NDJSON (?fmt=ndjson, по умолчанию) или CSV (?fmt=csv).
+
+        Тело читается потоком и пишется порциями; неверные строки пропускаются
+        и возвращаются в errors с номером строки.
+        """
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in PARSERS:
+            raise ValidationError({"fmt": [f"Поддерживаются форматы: {', '.join(PARSERS)}."]})
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        result = HabitImporter(request.user).run(lines, fmt)
+        return Response(
+            {"imported": result.imported, "failed": result.failed, "errors": result.errors},
+            status=status.HTTP_201_CREATED if result.imported else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def graph_depth(self, request):
+        try:
+            depth = int(request.query_params.get('depth', settings.HABIT_GRAPH_MAX_DEPTH))
+        except ValueError:
+            raise ValidationError({"depth": ["Ожидается целое число."]})
+        return max(0, min(depth, settings.HABIT_GRAPH_MAX_DEPTH))
+
+    def graph_data(self, nodes):
+        node_ids = {habit.pk for habit in nodes}
+        data = HabitSerializer(nodes, many=True).data
+        for item, habit in zip(data, nodes):
+            item["depth"] = habit.depth
+        edges = [
+            {"habit": habit.pk, "related_habit": habit.related_habit_id}
+            for habit in nodes
+            if habit.related_habit_id in node_ids
+        ]
+        return {"nodes": data, "edges": edges}
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda request: self.paginated_values(self.filter_queryset(self.get_queryset()))
+        )
+
+    def paginated_values(self, queryset):
+        """Страница привычек, сериализованная из строк values() без модельных объектов."""
+        serializer = self.values_serializer()
+        # Курсор строится по created_at и id последней строки, поэтому они читаются всегда
+        page = self.paginate_queryset(serializer.values(queryset, *self.paginator.cursor_fields))
+        return self.get_paginated_response(serializer.to_representation(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def requested_fields(self):
+        return requested_fields(self.request.query_params)
+
+    def values_serializer(self):
+        return values_serializer(self.requested_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'retrieve':
+            kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def conditional_response(self, request, respond, *args, **kwargs):
+        """Отвечает 304 без запроса к привычкам, если версия привычек пользователя совпала с If-None-Match."""
+        etag = quote_etag(
+            user_habits_etag(request.user.pk, request.get_full_path(), request.accepted_renderer.format)
+        )
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = respond(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+        return response
 
     def get_queryset(self):
         if self.action == 'public_habits':
             return Habit.objects.filter(is_public=True)
-        return Habit.objects.filter(user=self.request.user)
+        queryset = Habit.objects.filter(user=self.request.user)
+        if self.action == 'retrieve' and self.requested_fields() is not None:
+            # Из базы читаются только колонки запрошенных полей
+            queryset = queryset.only(*self.values_serializer().columns)
+        return queryset
 
     def perform_create(self, serializer):
         habit = serializer.save(user=self.request.user)
@@ -69,9 +270,8 @@ class HabitCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class PublicHabitView(APIView):
+    permission_classes = [AllowAny]
+
     def get(self, request):
-        """Получение публичных привычек."""
-        habits = Habit.objects.filter(is_public=True)
-        logger.info(f"Найдено публичных привычек: {habits.count()}")  # Логируем количество
-        serializer = HabitSerializer(habits, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """Получение публичных привычек: та же кешируемая лента, что и /api/habits/public/."""
+        return Response(get_public_feed(request))
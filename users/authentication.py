@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_cached_user, user_cache_key
+from .revocation import revocations
+
+
+class VerifiedTokenCache:
+    """LRU проверенных токенов процесса: подпись и срок токена проверяются один раз.
+
+    Токен лежит в кеше до истечения своего срока (claim exp), поэтому
+    просроченный токен снова пройдёт полную проверку и будет отклонён.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.tokens = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self.lock:
+            token = self.tokens.get(raw_token)
+            if token is None:
+                return None
+            if token.get("exp", 0) <= time.time():
+                del self.tokens[raw_token]
+                return None
+            self.tokens.move_to_end(raw_token)
+            return token
+
+    def set(self, raw_token, token):
+        with self.lock:
+            self.tokens[raw_token] = token
+            self.tokens.move_to_end(raw_token)
+            while len(self.tokens) > self.maxsize:
+                self.tokens.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+
+verified_tokens = VerifiedTokenCache(settings.JWT_VERIFIED_TOKEN_CACHE_SIZE)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT без запросов к базе на повторных запросах.
+
+    Проверенные токены берутся из LRU процесса, пользователь — из кеша на
+    JWT_USER_CACHE_TIMEOUT секунд; запись пользователя сбрасывает его кеш.
+    Отзыв токена проверяется на каждом запросе по Bloom-фильтру процесса.
+    """
+
+    async def aauthenticate(self, request):
+        """authenticate() для асинхронных представлений.
+
+        Когда токен, ответ об отзыве и пользователь уже в кешах, проверка идёт
+        в цикле событий; в поток она уходит, только если нужна база.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = verified_tokens.get(raw_token)
+        if token is not None and (user_id := token.get(api_settings.USER_ID_CLAIM)) is not None:
+            revoked = revocations.cached_is_revoked(token)
+            if revoked:
+                raise InvalidToken(_("Token is revoked"))
+            if revoked is not None and (user := await cache.aget(user_cache_key(user_id))) is not None:
+                return self.check_user(user, token), token
+        return await sync_to_async(self.authenticate)(request)
+
+    def get_validated_token(self, raw_token):
+        token = verified_tokens.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            verified_tokens.set(raw_token, token)
+        if revocations.is_revoked(token):
+            raise InvalidToken(_("Token is revoked"))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        return self.check_user(get_cached_user(user_id, lambda: self.load_user(user_id)), validated_token)
+
+    def check_user(self, user, validated_token):
+        # Проверки повторяются для каждого токена: пользователь в кеше общий
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+
+async def aauthenticate(request):
+    """Пользователь асинхронного представления по JWT, иначе по сессии; None, если запрос анонимный."""
+    result = await CachedJWTAuthentication().aauthenticate(request)
+    if result is not None:
+        return result[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def get_cached_user(user_id, load):
+    """Пользователь из кеша; при промахе загружается вызовом load и живёт JWT_USER_CACHE_TIMEOUT секунд."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = load()
+        cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import Counter
+from types import ModuleType
+
+import httpx
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+from habits.bench import delete_bench_users, new_report, percentile, seed_users, write_report
+from habits.views import HabitViewSet
+from users.views import AsyncLoginView, LoginView
+
+BENCH_EMAIL_DOMAIN = "login-bench.invalid"
+BENCH_PASSWORD = "bench-password"
+
+
+def bench_urlconf(mode):
+    """Адреса бенчмарка: вход в выбранном режиме и публичная лента как «другой» эндпоинт."""
+    login = LoginView.as_view() if mode == "sync" else csrf_exempt(AsyncLoginView.as_view())
+    urlconf = ModuleType(f"bench_login_storm_{mode}_urls")
+    urlconf.urlpatterns = [
+        path("login/", login),
+        # Параметры действия (AllowAny) передаются так же, как их передаёт роутер
+        path("public/", HabitViewSet.as_view({"get": "public"}, **HabitViewSet.public.kwargs)),
+    ]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк входа под нагрузкой через ASGI: пропускная способность входа и задержка "
+        "публичной ленты во время шторма входов для синхронного и асинхронного представлений."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="sync,async", help="Режимы входа через запятую: sync, async")
+        parser.add_argument("--logins", type=int, default=100, help="Число входов в шторме")
+        parser.add_argument("--concurrency", type=int, default=50, help="Одновременных входов")
+        parser.add_argument("--users", type=int, default=10, help="Пользователей, под которыми идут входы")
+        parser.add_argument("--probes", type=int, default=20, help="Запросов ленты для замера без нагрузки")
+        parser.add_argument("--probe-interval", type=float, default=0.01, help="Пауза между запросами ленты, с")
+        parser.add_argument("--output", default="bench_login_storm.json", help="Файл для результатов в JSON")
+
+    def handle(self, *args, **options):
+        report = new_report({key: options[key] for key in ("logins", "concurrency", "users", "probe_interval")})
+        self.cleanup()
+        try:
+            self.seed(options["users"])
+            for mode in options["modes"].split(","):
+                with override_settings(ROOT_URLCONF=bench_urlconf(mode)):
+                    result = asyncio.run(self.run_storm(get_asgi_application(), options))
+                result["mode"] = mode
+                report["results"].append(result)
+                self.stdout.write(
+                    f"{mode}: {result['logins_per_second']} входов/с, вход p50 {result['login_p50_seconds']} с, "
+                    f"лента без нагрузки p50 {result['idle_probe_p50_seconds']} с, "
+                    f"под нагрузкой p50 {result['probe_p50_seconds']} с, p99 {result['probe_p99_seconds']} с"
+                )
+        finally:
+            self.cleanup()
+
+        write_report(self, report, options["output"])
+
+    def seed(self, users):
+        # Хеш один на всех: засев не должен сам стоить секунды PBKDF2
+        seed_users(BENCH_EMAIL_DOMAIN, users, prefix="login", password=make_password(BENCH_PASSWORD))
+
+    async def run_storm(self, app, options):
+        users = options["users"]
+        login_latencies, probe_latencies, idle_latencies = [], [], []
+        statuses = Counter()
+        pending = iter(range(options["logins"]))
+        storm_over = asyncio.Event()
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+            async def probe():
+                started = time.perf_counter()
+                response = await client.get("/public/")
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+            async def login_worker():
+                for i in pending:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/login/",
+                        json={"email": f"login{i % users}@{BENCH_EMAIL_DOMAIN}", "password": BENCH_PASSWORD},
+                    )
+                    login_latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] += 1
+
+            async def prober():
+                while not storm_over.is_set():
+                    probe_latencies.append(await probe())
+                    await asyncio.sleep(options["probe_interval"])
+
+            for _ in range(options["probes"]):
+                idle_latencies.append(await probe())
+
+            probe_task = asyncio.create_task(prober())
+            started = time.perf_counter()
+            await asyncio.gather(*(login_worker() for _ in range(options["concurrency"])))
+            elapsed = time.perf_counter() - started
+            storm_over.set()
+            await probe_task
+
+        login_latencies.sort()
+        probe_latencies.sort()
+        idle_latencies.sort()
+        return {
+            "logins": options["logins"],
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "elapsed_seconds": round(elapsed, 3),
+            "logins_per_second": round(statuses[200] / elapsed, 1) if elapsed else None,
+            "login_p50_seconds": round(percentile(login_latencies, 0.50), 3),
+            "login_p99_seconds": round(percentile(login_latencies, 0.99), 3),
+            "idle_probe_p50_seconds": round(percentile(idle_latencies, 0.50), 4),
+            "probes": len(probe_latencies),
+            "probe_p50_seconds": round(percentile(probe_latencies, 0.50), 4) if probe_latencies else None,
+            "probe_p99_seconds": round(percentile(probe_latencies, 0.99), 4) if probe_latencies else None,
+        }
+
+    def cleanup(self):
+        delete_bench_users(BENCH_EMAIL_DOMAIN)
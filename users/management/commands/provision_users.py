@@ -0,0 +1,71 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.importer import PARSERS
+from users.provisioning import Checkpoint, UserProvisioner
+
+
+class Command(BaseCommand):
+    help = (
+        "Массовое создание пользователей с профилями из NDJSON или CSV: пароли хешируются "
+        "в пуле процессов, запись порциями через bulk_create, продолжение с контрольной точки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Файл с полями email, password, first_name, last_name, telegram_chat_id, timezone"
+        )
+        parser.add_argument("--format", choices=sorted(PARSERS), help="Формат файла, по умолчанию по расширению")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Пользователей в одной порции")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Процессов для хеширования паролей")
+        parser.add_argument("--checkpoint", help="Файл контрольной точки, по умолчанию <path>.checkpoint")
+        parser.add_argument("--restart", action="store_true", help="Начать с начала файла, игнорируя контрольную точку")
+        parser.add_argument("--errors", help="Файл для ошибок строк в NDJSON")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        fmt = options["format"] or path.suffix.lstrip(".").lower()
+        if fmt not in PARSERS:
+            raise CommandError(f"Не удалось определить формат файла {path}, укажите --format")
+        checkpoint = Checkpoint(options["checkpoint"] or f"{path}.checkpoint")
+        if options["restart"]:
+            checkpoint.clear()
+        elif line := checkpoint.load():
+            self.stdout.write(f"Продолжаем после строки {line}")
+
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Строка {result.line}: создано {result.created}, пропущено {result.skipped}, "
+                f"отклонено {result.failed} ({result.created / elapsed:.0f} пользователей/с)"
+            )
+
+        provisioner = UserProvisioner(
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            checkpoint=checkpoint,
+            progress=progress,
+            max_errors=None,
+        )
+        with path.open(encoding="utf-8", newline="") as lines:
+            result = provisioner.run(lines, fmt)
+
+        if options["errors"] and result.errors:
+            with open(options["errors"], "w", encoding="utf-8") as errors_file:
+                for error in result.errors:
+                    errors_file.write(json.dumps(error, ensure_ascii=False) + "\n")
+        else:
+            for error in result.errors[:20]:
+                self.stderr.write(f"Строка {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово за {time.perf_counter() - started:.1f} с: создано {result.created}, "
+                f"пропущено {result.skipped}, отклонено {result.failed}"
+            )
+        )
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+def revoke_by_generation(apps, schema_editor):
+    """Действующие отзывы всех токенов пользователя переводятся на поколения.
+
+    Токены, выпущенные до миграции, поколения не несут и считаются нулевым,
+    поэтому поколение 1 отзывает их все; новые входы получают поколение 1.
+    """
+    CustomUser = apps.get_model("users", "CustomUser")
+    TokenRevocation = apps.get_model("users", "TokenRevocation")
+    revoked = TokenRevocation.objects.filter(jti__isnull=True)
+    CustomUser.objects.filter(pk__in=revoked.values("user_id")).update(token_generation=1)
+    revoked.update(generation=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_token_revocation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="token_generation",
+            field=models.PositiveIntegerField(default=0, verbose_name="token generation"),
+        ),
+        migrations.AddField(
+            model_name="tokenrevocation",
+            name="generation",
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name="token generation"),
+        ),
+        migrations.RunPython(revoke_by_generation, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="tokenrevocation",
+            name="revoked_before",
+        ),
+    ]
@@ -36,6 +36,8 @@ class CustomUser(AbstractBaseUser):
     is_staff = models.BooleanField(_('staff status'), default=False)
     is_superuser = models.BooleanField(_('superuser status'), default=False)
     date_joined = models.DateTimeField(_('date joined'), auto_now_add=True)
+    # Растёт при выходе со всех устройств; выпущенные раньше токены несут меньшее значение
+    token_generation = models.PositiveIntegerField(_('token generation'), default=0)
     groups = models.ManyToManyField(Group, related_name='customuser_set', blank=True)
     user_permissions = models.ManyToManyField(Permission, related_name='customuser_set', blank=True)
 
@@ -58,3 +60,18 @@ class CustomUser(AbstractBaseUser):
     def has_module_perms(self, app_label):
         """У пользователя есть разрешение на доступ к модулю?"""
         return self.is_superuser
+
+
+class TokenRevocation(models.Model):
+    """Отзыв JWT: одного токена по jti или всех токенов пользователя с поколением меньше generation."""
+
+    jti = models.CharField(_('token id'), max_length=255, unique=True, null=True, blank=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='token_revocations')
+    generation = models.PositiveIntegerField(_('token generation'), null=True, blank=True)
+    # После истечения отозванного токена строка больше не нужна
+    expires_at = models.DateTimeField(_('expires at'), db_index=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('token revocation')
+        verbose_name_plural = _('token revocations')
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class HasherOverloaded(Exception):
+    """Очередь хеширования паролей заполнена."""
+
+
+class PasswordHasherPool:
+    """Пул потоков для хеширования паролей вне цикла событий.
+
+    PBKDF2 из hashlib отпускает GIL, поэтому хеширование в потоках не
+    останавливает обработку других запросов. Одновременно выполняется не
+    больше workers задач и ждёт не больше queue_size: при всплеске входов
+    лишние запросы сразу получают отказ, а не копятся в памяти.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    async def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HasherOverloaded
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.slots.release()
+
+
+password_hasher = PasswordHasherPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from habits.importer import PARSERS
+from habits.models import Profile
+from habits.utils import chunked
+from habits.validators import validate_timezone
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+USER_FIELDS = ("first_name", "last_name")
+
+
+@dataclass
+class ProvisionResult:
+    """Итог загрузки: созданные, пропущенные (email уже занят) и отклонённые строки."""
+
+    created: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    # Последняя строка файла, обработка которой записана в базу
+    line: int = 0
+
+
+def hash_password(password):
+    return make_password(password)
+
+
+def init_worker():
+    # Процессы, запущенные через spawn, не наследуют настроенный Django
+    django.setup()
+
+
+def clean_row(row):
+    """Значения пользователя и профиля из строки файла и словарь ошибок (пустой, если строка верна)."""
+    errors = {}
+    email = str(row.get("email") or "").strip()
+    try:
+        validate_email(email)
+    except ValidationError as e:
+        errors["email"] = e.messages
+    password = row.get("password")
+    if password is None or password == "":
+        errors["password"] = ["Обязательное поле."]
+    elif not isinstance(password, str):
+        # make_password в пуле упал бы на числе или списке и оборвал бы всю порцию
+        errors["password"] = ["Пароль должен быть строкой."]
+
+    values = {"email": User.objects.normalize_email(email), "password": password}
+    for name in USER_FIELDS:
+        value = str(row.get(name) or "")
+        try:
+            User._meta.get_field(name).run_validators(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+        values[name] = value
+
+    chat_id = row.get("telegram_chat_id")
+    profile = {
+        "telegram_chat_id": str(chat_id) if chat_id not in (None, "") else None,
+        "timezone": row.get("timezone") or settings.TIME_ZONE,
+    }
+    try:
+        validate_timezone(profile["timezone"])
+    except ValidationError as e:
+        errors["timezone"] = e.messages
+    except TypeError:
+        errors["timezone"] = ["Часовой пояс должен быть строкой."]
+    return values, profile, errors
+
+
+class Checkpoint:
+    """Номер последней записанной строки файла: после перезапуска загрузка продолжается с неё."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self):
+        if not self.path.exists():
+            return 0
+        return json.loads(self.path.read_text())["line"]
+
+    def save(self, result):
+        # Через временный файл: оборванная запись не испортит контрольную точку
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"line": result.line, "created": result.created}))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class UserProvisioner:
+    """Массовое создание пользователей с профилями из NDJSON или CSV.
+
+    Пароли порции хешируются в пуле процессов на всех ядрах, пока
+    предыдущая порция пишется в базу двумя bulk_create (пользователи и
+    профили) в одной транзакции. После каждой записанной порции сохраняется
+    контрольная точка; уже занятые email пропускаются, поэтому повторный
+    запуск ничего не дублирует.
+    """
+
+    def __init__(self, batch_size=1000, workers=None, checkpoint=None, progress=None, max_errors=1000):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.max_errors = max_errors
+        self.seen = set()
+
+    def run(self, lines, fmt):
+        start_line = self.checkpoint.load() if self.checkpoint else 0
+        result = ProvisionResult(line=start_line)
+        rows = (item for item in PARSERS[fmt](lines) if item[0] > start_line)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            pending = None
+            for batch in chunked(rows, self.batch_size):
+                prepared = self.prepare(batch, result)
+                passwords = [values["password"] for _, values, _ in prepared]
+                hashes = executor.map(
+                    hash_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))
+                )
+                # Пока хешируется эта порция, в базу пишется предыдущая
+                if pending:
+                    self.write(*pending, result)
+                pending = (prepared, hashes, batch[-1][0])
+            if pending:
+                self.write(*pending, result)
+
+        if self.checkpoint:
+            self.checkpoint.clear()
+        logger.info(
+            f"Загрузка пользователей: создано {result.created}, пропущено {result.skipped}, отклонено {result.failed}"
+        )
+        return result
+
+    def prepare(self, batch, result):
+        """Проверенные строки порции без ошибок и без email, уже занятых в базе или в файле."""
+        cleaned = []
+        for line_no, row, errors in batch:
+            if row is not None:
+                values, profile, errors = clean_row(row)
+            if errors:
+                result.failed += 1
+                if self.max_errors is None or len(result.errors) < self.max_errors:
+                    result.errors.append({"line": line_no, "errors": errors})
+                continue
+            cleaned.append((line_no, values, profile))
+
+        existing = set(
+            User.objects.filter(email__in=[values["email"] for _, values, _ in cleaned]).values_list("email", flat=True)
+        )
+        prepared = []
+        for line_no, values, profile in cleaned:
+            if values["email"] in existing or values["email"] in self.seen:
+                result.skipped += 1
+                continue
+            self.seen.add(values["email"])
+            prepared.append((line_no, values, profile))
+        return prepared
+
+    def write(self, prepared, hashes, last_line, result):
+        users = [User(**{**values, "password": hashed}) for (_, values, _), hashed in zip(prepared, hashes)]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            Profile.objects.bulk_create(
+                [Profile(user=user, **profile) for user, (_, _, profile) in zip(users, prepared)]
+            )
+        result.created += len(users)
+        result.line = last_line
+        if self.checkpoint:
+            self.checkpoint.save(result)
+        if self.progress:
+            self.progress(result)
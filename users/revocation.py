@@ -0,0 +1,196 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser, TokenRevocation
+
+# Поколение токенов пользователя на момент выпуска; access-токен копирует его из refresh
+GENERATION_CLAIM = "gen"
+
+
+class BloomFilter:
+    """Bloom-фильтр строк: ложные срабатывания с вероятностью около error_rate, пропусков нет."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        # Двойное хеширование: k позиций из двух половин одного дайджеста
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+def jti_key(jti):
+    return f"jti:{jti}"
+
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+class RevocationFilter:
+    """Проверка отзыва JWT в памяти процесса.
+
+    Bloom-фильтр пересобирается из TokenRevocation не реже раза в
+    JWT_REVOCATION_SYNC_INTERVAL секунд, поэтому отзыв в другом процессе
+    действует не позже следующей синхронизации, а в своём — сразу. К базе
+    запрос идёт только при попадании в фильтр; его ответ помнится до
+    следующей синхронизации. Пересобирает фильтр один поток, остальные
+    тем временем проверяют токены по прежнему.
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.synced_at = 0.0
+        self.checked = {}
+        # Ключи, добавленные после последней синхронизации: пересборка могла прочитать базу раньше них
+        self.added = []
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+            self.checked = {}
+            self.added = []
+
+    def stale(self):
+        return self.bloom is None or time.monotonic() - self.synced_at >= settings.JWT_REVOCATION_SYNC_INTERVAL
+
+    def sync(self):
+        bloom = BloomFilter(settings.JWT_REVOCATION_BLOOM_CAPACITY, settings.JWT_REVOCATION_BLOOM_ERROR_RATE)
+        rows = TokenRevocation.objects.filter(expires_at__gt=timezone.now()).values_list("jti", "user_id")
+        for jti, user_id in rows.iterator(chunk_size=10000):
+            bloom.add(jti_key(jti) if jti else user_key(user_id))
+        with self.lock:
+            for key in self.added:
+                bloom.add(key)
+            self.bloom, self.checked, self.added, self.synced_at = bloom, {}, [], time.monotonic()
+
+    def current(self):
+        if self.stale():
+            # Без фильтра ждём того, кто его строит; с устаревшим — работаем по нему, пока он пересобирается
+            if self.sync_lock.acquire(blocking=self.bloom is None):
+                try:
+                    if self.stale():
+                        self.sync()
+                finally:
+                    self.sync_lock.release()
+        return self.bloom
+
+    def add(self, key):
+        """Отзыв из этого процесса действует сразу, не дожидаясь синхронизации."""
+        self.current()
+        with self.lock:
+            self.bloom.add(key)
+            self.added.append(key)
+            self.checked = {}
+
+    def checks(self, token):
+        """Проверки отзыва токена: ключ в фильтре, ключ запомненного ответа и запрос к базе."""
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti:
+            yield jti_key(jti), ("jti", jti), lambda: jti_revoked(jti)
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            # Токены, выпущенные до появления поколений, считаются нулевым
+            generation = token.get(GENERATION_CLAIM, 0)
+            yield user_key(user_id), ("user", user_id, generation), lambda: user_tokens_revoked(user_id, generation)
+
+    def is_revoked(self, token):
+        bloom = self.current()
+        return any(key in bloom and self.lookup(checked, check) for key, checked, check in self.checks(token))
+
+    def cached_is_revoked(self, token):
+        """is_revoked без обращения к базе; None, если для ответа нужна синхронизация или запрос."""
+        bloom = self.bloom
+        if bloom is None or self.stale():
+            return None
+        for key, checked, _ in self.checks(token):
+            if key in bloom:
+                revoked = self.checked.get(checked)
+                if revoked is None:
+                    return None
+                if revoked:
+                    return True
+        return False
+
+    def lookup(self, key, check):
+        revoked = self.checked.get(key)
+        if revoked is None:
+            revoked = self.checked[key] = check()
+        return revoked
+
+
+def jti_revoked(jti):
+    return TokenRevocation.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+
+def user_tokens_revoked(user_id, generation):
+    return TokenRevocation.objects.filter(
+        user_id=user_id, jti__isnull=True, generation__gt=generation, expires_at__gt=timezone.now()
+    ).exists()
+
+
+revocations = RevocationFilter()
+
+
+def tokens_for_user(user):
+    """Refresh-токен пользователя с текущим поколением токенов."""
+    refresh = RefreshToken.for_user(user)
+    refresh[GENERATION_CLAIM] = user.token_generation
+    return refresh
+
+
+def revoke_tokens(user, tokens):
+    """Отзывает токены пользователя по jti до истечения их срока."""
+    TokenRevocation.objects.bulk_create(
+        [
+            TokenRevocation(
+                jti=token[api_settings.JTI_CLAIM],
+                user=user,
+                expires_at=datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc),
+            )
+            for token in tokens
+        ],
+        ignore_conflicts=True,
+    )
+    for token in tokens:
+        revocations.add(jti_key(token[api_settings.JTI_CLAIM]))
+
+
+def revoke_user_tokens(user):
+    """Отзывает все выпущенные пользователю токены; строка живёт, пока не истекут их refresh-токены.
+
+    Граница отзыва — поколение, а не время выпуска: iat в токене с точностью
+    до секунды, и вход в ту же секунду после выхода не должен быть отозван.
+    """
+    with transaction.atomic():
+        CustomUser.objects.filter(pk=user.pk).update(token_generation=F("token_generation") + 1)
+        user.token_generation = CustomUser.objects.values_list("token_generation", flat=True).get(pk=user.pk)
+        TokenRevocation.objects.create(
+            user=user,
+            generation=user.token_generation,
+            expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME,
+        )
+    revocations.add(user_key(user.pk))
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Сброс закешированного пользователя: смена пароля и отключение действуют сразу."""
+    user_id = instance.pk
+    invalidate_user(user_id)
+    # И после коммита: параллельный запрос мог успеть закешировать старую запись
+    transaction.on_commit(lambda: invalidate_user(user_id))
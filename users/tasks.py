@@ -0,0 +1,17 @@
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from .models import TokenRevocation
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def purge_token_revocations():
+    """Удаляет отзывы токенов, срок которых уже истёк: такие токены и так не пройдут проверку."""
+    deleted, _ = TokenRevocation.objects.filter(expires_at__lte=timezone.now()).delete()
+    logger.info(f"Удалено истёкших отзывов токенов: {deleted}")
+    return deleted
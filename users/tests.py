@@ -1,3 +1,317 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import aauthenticate, verified_tokens
+from .models import TokenRevocation
+from .passwords import PasswordHasherPool
+from .provisioning import Checkpoint, UserProvisioner
+from .revocation import BloomFilter, RevocationFilter, revocations, revoke_tokens, tokens_for_user
+from .views import AsyncLoginView, AsyncRegisterView
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        verified_tokens.clear()
+        revocations.reset()
+        self.user = User.objects.create_user(email="jwt@example.com", password="password")
+        self.tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def login(self):
+        return self.client.post("/api/users/login/", {"email": "jwt@example.com", "password": "password"}).data
+
+    def auth_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        tables = ("users_customuser", "users_tokenrevocation", "authtoken_token", "django_session")
+        return response, [query["sql"] for query in queries.captured_queries if any(t in query["sql"] for t in tables)]
+
+    def test_repeated_requests_make_no_auth_queries(self):
+        response, queries = self.auth_queries("/api/habits/")
+        self.assertEqual(response.status_code, 200)
+        # Пользователь и первая синхронизация фильтра отзыва
+        self.assertEqual(len(queries), 2)
+
+        response, queries = self.auth_queries("/api/habits/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_user_save_invalidates_cache(self):
+        self.auth_queries("/api/habits/")
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        response, _ = self.auth_queries("/api/habits/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer not-a-token")
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        other = self.login()
+        response = self.client.post("/api/users/logout/", {"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(TokenRevocation.objects.count(), 2)
+
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {other['access']}")
+        response, queries = self.auth_queries("/api/habits/")
+        self.assertEqual(response.status_code, 200)
+        # Токен не попал в фильтр: к хранилищу отзывов запроса нет
+        self.assertFalse(any("users_tokenrevocation" in sql for sql in queries))
+
+    def test_logout_all_revokes_earlier_tokens(self):
+        other = self.login()
+        self.assertEqual(self.client.post("/api/users/logout-all/").status_code, 204)
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {other['access']}")
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+
+        # Новые токены после выхода со всех устройств действуют
+        fresh = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {fresh['access']}")
+        self.assertEqual(self.client.get("/api/habits/").status_code, 200)
+
+    def test_login_in_the_same_second_as_logout_all_is_not_revoked(self):
+        # iat у всех токенов одинаковый: граница отзыва не может опираться на время выпуска
+        now = timezone.now().replace(microsecond=0)
+        with mock.patch("rest_framework_simplejwt.tokens.aware_utcnow", return_value=now):
+            stale = self.login()
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {stale['access']}")
+            self.assertEqual(self.client.post("/api/users/logout-all/").status_code, 204)
+            fresh = self.login()
+
+        self.assertEqual(AccessToken(fresh["access"])["iat"], AccessToken(stale["access"])["iat"])
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {fresh['access']}")
+        self.assertEqual(self.client.get("/api/habits/").status_code, 200)
+        # И после пересборки фильтра из базы
+        revocations.reset()
+        self.assertEqual(self.client.get("/api/habits/").status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {stale['access']}")
+        self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+
+    def test_revocation_from_another_process_applies_after_sync(self):
+        self.client.get("/api/habits/")
+        TokenRevocation.objects.create(
+            jti=AccessToken(self.tokens["access"])["jti"], user=self.user, expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self.client.get("/api/habits/").status_code, 200)
+        with override_settings(JWT_REVOCATION_SYNC_INTERVAL=0):
+            self.assertEqual(self.client.get("/api/habits/").status_code, 401)
+
+    def test_bloom_false_positive_falls_back_to_store(self):
+        self.client.get("/api/habits/")
+        with mock.patch.object(BloomFilter, "__contains__", return_value=True):
+            response, queries = self.auth_queries("/api/habits/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum("users_tokenrevocation" in sql for sql in queries), 2)
+
+
+class BloomFilterTest(SimpleTestCase):
+
+    def test_added_keys_are_found_and_false_positives_are_rare(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti:{i}")
+        self.assertTrue(all(f"jti:{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RevocationFilterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.filter = RevocationFilter()
+        self.release = threading.Event()
+        self.queries = 0
+        patcher = mock.patch("users.revocation.TokenRevocation.objects.filter", side_effect=self.query)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def query(self, **kwargs):
+        self.queries += 1
+        rows = mock.Mock()
+        rows.values_list.return_value.iterator.side_effect = lambda **kwargs: self.release.wait(5) and iter([])
+        return rows
+
+    def test_concurrent_requests_build_the_filter_once(self):
+        blooms = []
+        threads = [threading.Thread(target=lambda: blooms.append(self.filter.current())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.queries, 1)
+        self.assertEqual(len(blooms), 8)
+        self.assertTrue(all(bloom is blooms[0] for bloom in blooms))
+
+    def test_stale_filter_is_served_while_rebuilding(self):
+        self.release.set()
+        old = self.filter.current()
+        self.release.clear()
+        self.filter.synced_at = 0.0
+        rebuild = threading.Thread(target=self.filter.current)
+        rebuild.start()
+        while self.queries < 2:
+            time.sleep(0.001)
+
+        # Пересборка ещё идёт: запрос не ждёт её и не начинает вторую
+        self.assertIs(self.filter.current(), old)
+        self.filter.add("user:1")
+        self.release.set()
+        rebuild.join()
+
+        self.assertEqual(self.queries, 2)
+        self.assertIsNot(self.filter.bloom, old)
+        # Отзыв во время пересборки не теряется, хотя база была прочитана раньше
+        self.assertIn("user:1", self.filter.bloom)
+
+
+class AsyncAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        verified_tokens.clear()
+        revocations.reset()
+        self.user = User.objects.create_user(email="async-jwt@example.com", password="password")
+        self.token = str(tokens_for_user(self.user).access_token)
+
+    def request(self, token):
+        return AsyncRequestFactory().get("/", headers={"Authorization": f"Bearer {token}"})
+
+    async def test_cached_token_is_checked_without_a_thread(self):
+        # Первый запрос проверяет токен и загружает пользователя в потоке
+        self.assertEqual((await aauthenticate(self.request(self.token))).pk, self.user.pk)
+
+        with mock.patch("users.authentication.sync_to_async", side_effect=AssertionError("ушли в поток")):
+            user = await aauthenticate(self.request(self.token))
+        self.assertEqual(user.pk, self.user.pk)
+
+        await sync_to_async(revoke_tokens)(self.user, [AccessToken(self.token)])
+        # Ответ об отзыве ещё не запомнен: за ним идём в базу, дальше он известен без неё
+        with self.assertRaises(InvalidToken):
+            await aauthenticate(self.request(self.token))
+        with mock.patch("users.authentication.sync_to_async", side_effect=AssertionError("ушли в поток")):
+            with self.assertRaises(InvalidToken):
+                await aauthenticate(self.request(self.token))
+
+    async def test_uncached_user_is_loaded_in_a_thread(self):
+        await aauthenticate(self.request(self.token))
+        await cache.aclear()
+        with mock.patch("users.authentication.sync_to_async", wraps=sync_to_async) as to_thread:
+            user = await aauthenticate(self.request(self.token))
+        self.assertEqual(user.pk, self.user.pk)
+        to_thread.assert_called_once()
+
+
+class AsyncAuthViewsTest(TestCase):
+
+    def post(self, view, data):
+        request = AsyncRequestFactory().post("/", json.dumps(data), content_type="application/json")
+        return view.as_view()(request)
+
+    async def test_register_and_login(self):
+        data = {"email": "async@example.com", "password": "password", "first_name": "A", "last_name": "B"}
+        response = await self.post(AsyncRegisterView, data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            json.loads(response.content), {"email": "async@example.com", "first_name": "A", "last_name": "B"}
+        )
+        user = await User.objects.aget(email="async@example.com")
+        self.assertTrue(user.check_password("password"))
+        self.assertEqual((await self.post(AsyncRegisterView, data)).status_code, 400)
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "password"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(json.loads(response.content)), {"refresh", "access"})
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "wrong"})
+        self.assertEqual(response.status_code, 401)
+        response = await self.post(AsyncLoginView, {"email": "nobody@example.com", "password": "password"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_full_hasher_queue_returns_503(self):
+        pool = PasswordHasherPool(workers=1, queue_size=0)
+        pool.slots.acquire()
+        with mock.patch("users.views.password_hasher", pool):
+            response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "password"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class UserProvisionerTest(TestCase):
+
+    def test_provision_in_batches_with_profiles_and_checkpoint(self):
+        User.objects.create_user(email="taken@example.com", password="password")
+        rows = [
+            {"email": "skipped@example.com", "password": "p"},
+            {"email": "one@example.com", "password": "p1", "first_name": "One", "telegram_chat_id": 100},
+            {"email": "taken@example.com", "password": "p"},
+            {"email": "not-an-email", "password": "p"},
+            {"email": "two@example.com", "password": "p2", "timezone": "Asia/Tokyo"},
+            {"email": "one@example.com", "password": "p"},
+            {"email": "three@example.com", "password": "p3", "timezone": "Mars/Base"},
+        ]
+        lines = [json.dumps(row) + "\n" for row in rows]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Первая строка уже записана прошлым запуском
+        checkpoint = Checkpoint(Path(directory.name) / "users.ndjson.checkpoint")
+        checkpoint.path.write_text(json.dumps({"line": 1}))
+        saved = []
+        provisioner = UserProvisioner(
+            batch_size=2, workers=2, checkpoint=checkpoint, progress=lambda result: saved.append(result.line)
+        )
+
+        result = provisioner.run(lines, "ndjson")
+
+        self.assertEqual((result.created, result.skipped, result.failed), (2, 2, 2))
+        self.assertEqual([error["line"] for error in result.errors], [4, 7])
+        self.assertEqual(saved, [3, 5, 7])
+        self.assertFalse(User.objects.filter(email="skipped@example.com").exists())
+        one = User.objects.select_related("profile").get(email="one@example.com")
+        self.assertTrue(one.check_password("p1"))
+        self.assertEqual((one.first_name, one.profile.telegram_chat_id), ("One", "100"))
+        self.assertEqual(User.objects.get(email="two@example.com").profile.timezone, "Asia/Tokyo")
+        self.assertFalse(checkpoint.path.exists())
+
+    def test_provision_rejects_mistyped_values_per_row(self):
+        rows = [
+            {"email": "number@example.com", "password": 12345},
+            {"email": "list@example.com", "password": ["p"]},
+            {"email": "empty@example.com", "password": ""},
+            {"email": "zone@example.com", "password": "p", "timezone": 3},
+            {"email": "ok@example.com", "password": "p"},
+        ]
+
+        result = UserProvisioner(batch_size=10, workers=1).run([json.dumps(row) for row in rows], "ndjson")
+
+        self.assertEqual((result.created, result.failed), (1, 4))
+        self.assertEqual([list(error["errors"]) for error in result.errors], [["password"]] * 3 + [["timezone"]])
+        self.assertEqual(list(User.objects.values_list("email", flat=True)), ["ok@example.com"])
@@ -1,7 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterView, LoginView
+from django.views.decorators.csrf import csrf_exempt
+from .views import AsyncLoginView, AsyncRegisterView, LogoutAllView, LogoutView, RegisterView, LoginView
 
-urlpatterns = [
-    path('register/', RegisterView.as_view(), name='register'),
-    path('login/', LoginView.as_view(), name='login'),
+if settings.ASYNC_AUTH_VIEWS:
+    # Под ASGI вход и регистрация не занимают поток хешированием пароля
+    urlpatterns = [
+        path('register/', csrf_exempt(AsyncRegisterView.as_view()), name='register'),
+        path('login/', csrf_exempt(AsyncLoginView.as_view()), name='login'),
+    ]
+else:
+    urlpatterns = [
+        path('register/', RegisterView.as_view(), name='register'),
+        path('login/', LoginView.as_view(), name='login'),
+    ]
+
+urlpatterns += [
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('logout-all/', LogoutAllView.as_view(), name='logout_all'),
 ]
@@ -1,3 +1,9 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password, verify_password
+from django.http import JsonResponse
+from django.views import View
 from rest_framework import generics
 from rest_framework.exceptions import ValidationError
 from .serializers import RegisterSerializer
@@ -6,8 +12,13 @@ import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
 from django.contrib.auth import authenticate
+from .passwords import HasherOverloaded, password_hasher
+from .revocation import revoke_tokens, revoke_user_tokens, tokens_for_user
 from .serializers import LoginSerializer
 
 # Инициализируем логгер
@@ -16,6 +27,9 @@ logger = logging.getLogger(__name__)
 class RegisterView(generics.CreateAPIView):
     queryset = get_user_model().objects.all()
     serializer_class = RegisterSerializer
+    # Регистрация и вход доступны без авторизации, просроченный токен в заголовке им не мешает
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
     def perform_create(self, serializer):
         """Добавляем логирование успешной регистрации."""
@@ -31,6 +45,9 @@ class RegisterView(generics.CreateAPIView):
 
 
 class LoginView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
@@ -39,7 +56,7 @@ class LoginView(APIView):
                 password=serializer.validated_data['password']
             )
             if user:
-                refresh = RefreshToken.for_user(user)
+                refresh = tokens_for_user(user)
                 logger.info(f"Успешная авторизация: {user.email}")
                 return Response({
                     'refresh': str(refresh),
@@ -51,3 +68,110 @@ class LoginView(APIView):
         else:
             logger.error(f"Ошибка авторизации: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LogoutView(APIView):
+    """Выход: отзывает access-токен запроса и refresh-токен из тела запроса, если он передан."""
+
+    def post(self, request):
+        tokens = [request.auth] if isinstance(request.auth, Token) else []
+        if raw_refresh := request.data.get('refresh'):
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError as e:
+                return Response({"refresh": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get(api_settings.USER_ID_CLAIM) != request.user.pk:
+                return Response({"refresh": ["Токен выдан другому пользователю."]}, status=status.HTTP_400_BAD_REQUEST)
+            tokens.append(refresh)
+        revoke_tokens(request.user, tokens)
+        logger.info(f"Пользователь вышел: {request.user.email}")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LogoutAllView(APIView):
+    """Выход со всех устройств: отзывает все токены, выпущенные пользователю до этого момента."""
+
+    def post(self, request):
+        revoke_user_tokens(request.user)
+        logger.info(f"Пользователь вышел со всех устройств: {request.user.email}")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def request_data(request):
+    """Данные формы или JSON из тела запроса, как их принимают синхронные представления DRF."""
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+    return request.POST
+
+
+def overloaded_response():
+    response = JsonResponse({"error": "Too many login requests"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = "1"
+    return response
+
+
+class AsyncRegisterView(View):
+    """Асинхронная регистрация для ASGI: пароль хешируется в пуле потоков, а не в цикле событий."""
+
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = RegisterSerializer(data=data)
+        # Проверка уникальности email обращается к базе
+        if not await sync_to_async(serializer.is_valid)():
+            logger.error(f"Ошибка регистрации: {serializer.errors}")
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = dict(serializer.validated_data)
+        try:
+            password = await password_hasher.run(make_password, fields.pop("password"))
+        except HasherOverloaded:
+            return overloaded_response()
+        User = get_user_model()
+        user = User(email=User.objects.normalize_email(fields.pop("email")), password=password, **fields)
+        await user.asave()
+        logger.info(f"Новый пользователь зарегистрирован: {user.email}")
+        return JsonResponse(RegisterSerializer(user).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncLoginView(View):
+    """Асинхронный вход для ASGI с той же логикой, что authenticate() с ModelBackend."""
+
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = LoginSerializer(data=data)
+        if not serializer.is_valid():
+            logger.error(f"Ошибка авторизации: {serializer.errors}")
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+        user = await get_user_model().objects.filter(email=email).afirst()
+        try:
+            if user is None:
+                # Как ModelBackend: хешируем и для неизвестного email, чтобы время ответа его не выдавало
+                await password_hasher.run(make_password, password)
+                is_correct = False
+            else:
+                is_correct, must_update = await password_hasher.run(verify_password, password, user.password)
+                if is_correct and must_update:
+                    user.password = await password_hasher.run(make_password, password)
+                    await user.asave(update_fields=["password"])
+        except HasherOverloaded:
+            return overloaded_response()
+
+        if not is_correct or not user.is_active:
+            logger.warning(f"Неудачная попытка входа: {email}")
+            return JsonResponse({"error": "Invalid Credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        refresh = tokens_for_user(user)
+        logger.info(f"Успешная авторизация: {user.email}")
+        return JsonResponse({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        })